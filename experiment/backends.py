@@ -0,0 +1,102 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Optional hardware backends for the Episodic Extinction experiment.
+
+The eye tracker (pylink), serial and parallel marker ports and the EDF
+conversion (hedfpy) are only imported when their setting in
+expsettings.yml enables them, so behaviour-only sessions start without
+them and machines without them installed can still run. Enabled backends
+are imported before the window opens, so a missing one fails at startup.
+Every import made through ``import_timed`` is timed for the startup report.
+"""
+
+from importlib.util import find_spec
+import importlib
+import time
+import sys
+
+# modules every session needs, imported first so the report shows what each costs
+CORE_MODULES = ["numpy", "pandas", "yaml", "psychopy.visual", "psychopy.sound", "exptools2.core"]
+
+# backend: (module, test_settings switch that enables it)
+BACKENDS = {
+    "eyetracker": ("pylink", "eyetracker_on"),
+    "serial": ("serial", "serial_markers_on"),
+    "parallel": ("psychopy.parallel", "parallel_markers_on"),
+}
+
+# EDF conversion runs in its own process (edf_convert.py): only checked, never imported here
+EDF_MODULE = "hedfpy"
+
+IMPORT_TIMES = {}   # module: seconds its (first) import took
+
+
+class BackendError(ImportError):
+    """A backend enabled in the settings is not installed."""
+
+
+def import_timed(name):
+    """Import module ``name``, recording how long it took if it was not loaded yet."""
+    if name in sys.modules:
+        return sys.modules[name]
+    t0 = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES[name] = time.perf_counter() - t0
+    return module
+
+
+def is_installed(name):
+    """True if module ``name`` can be imported (without importing it)."""
+    try:
+        return name in sys.modules or find_spec(name) is not None
+    except ModuleNotFoundError:  # parent package missing
+        return False
+
+
+def import_core():
+    """Import the core modules one by one, for the startup report."""
+    for name in CORE_MODULES:
+        import_timed(name)
+
+
+def load_backends(settings):
+    """
+    Import the backends enabled in ``settings``.
+
+    Returns
+    -------
+    dict backend: module for every enabled backend, plus ``edf_convert``
+    (True if hedfpy is installed and conversion is on)
+    """
+    loaded = {}
+    for backend, (name, switch) in BACKENDS.items():
+        if not settings["test_settings"][switch]:
+            continue
+        try:
+            loaded[backend] = import_timed(name)
+        except ImportError as e:
+            raise BackendError(f"{backend} is enabled in the settings, but {name} cannot be "
+                               f"imported ({e}); install it or switch it off") from e
+
+    convert = settings.get("eyetracker", {}).get("convert_edf", "background")
+    loaded["edf_convert"] = False
+    if settings["test_settings"]["eyetracker_on"] and convert != "off":
+        loaded["edf_convert"] = is_installed(EDF_MODULE)
+        if not loaded["edf_convert"]:
+            print(f"Warning: {EDF_MODULE} is not installed, EDF files are not converted at close "
+                  f"(run edf_convert.py on the analysis machine)")
+    return loaded
+
+
+def import_report():
+    """Startup report: time per module imported through import_timed, slowest first."""
+    if not IMPORT_TIMES:
+        return "Imports: none timed"
+    width = max(len(name) for name in IMPORT_TIMES)
+    lines = [f"  {name:<{width}}  {seconds * 1000:8.1f} ms"
+             for name, seconds in sorted(IMPORT_TIMES.items(), key=lambda item: -item[1])]
+    total = sum(IMPORT_TIMES.values())
+    return "\n".join([f"Imports ({total:.2f} s):", *lines])
@@ -0,0 +1,165 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Cohort-level loader of session logs for the Episodic Extinction experiment.
+
+Discovers every session under ``logs/`` in the layout main.py creates,
+
+    logs/sub-<subject>/sub-<subject>_ses-<sess>_v-<version>[<timestamp>]/
+        sub-<subject>_ses-<sess>_v-<version>_events.tsv
+
+(a timestamp suffix marks a re-run of the same session, see main.py),
+reads the events logs in a process pool and concatenates them into one
+typed table. The result is cached as Parquet; on the next call only new
+or changed sessions are read.
+
+Example:
+    from cohort import load_cohort, ratings
+    events = load_cohort("logs")
+    distress = ratings(events).query("scale == 'distress'")
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pandas as pd
+import numpy as np
+import re
+import os
+
+EVENTS_PATTERN = re.compile(
+    r"^sub-(?P<subject>[^_]+)_ses-(?P<sess>\d+)_v-(?P<version>[^_]+)_events\.tsv$")
+
+# identifying columns, first in the table
+ID_COLUMNS = ["subject", "sess", "version", "run"]
+
+# low-cardinality text columns stored as categoricals
+CATEGORICAL_COLUMNS = ["subject", "version", "run", "event_type", "CS", "US", "US_sound"]
+
+# trial parameters copied to every row of their trial (e.g. onto ratings and responses)
+PARAMETER_COLUMNS = ["CS", "US", "US_sound", "condition", "trial", "episode_nr", "valence",
+                     "presentation_order", "block"]
+
+CACHE_NAME = "cohort_events.parquet"
+
+
+# =========================================================================
+# Discovery
+# =========================================================================
+
+def discover_sessions(root="logs"):
+    """
+    One row per session log under ``root``: subject, sess, version, run
+    (timestamp suffix of a re-run directory, '' for the first run), path,
+    and the file's size and modification time (to detect changes).
+    """
+    rows = []
+    for path in sorted(Path(root).glob("sub-*/*/*_events.tsv")):
+        match = EVENTS_PATTERN.match(path.name)
+        if match is None:
+            continue
+        output_str = path.name[:-len("_events.tsv")]
+        run = path.parent.name[len(output_str):] if path.parent.name.startswith(output_str) else path.parent.name
+        stat = path.stat()
+        rows.append(dict(subject=match["subject"], sess=int(match["sess"]), version=match["version"],
+                         run=run, path=str(path), size=stat.st_size, mtime=stat.st_mtime))
+    return pd.DataFrame(rows, columns=ID_COLUMNS + ["path", "size", "mtime"])
+
+
+# =========================================================================
+# Loading
+# =========================================================================
+
+def read_session(session):
+    """Read one events log, with its identifying columns and trial parameters on every row."""
+    events = pd.read_csv(session["path"], sep="\t")
+
+    # a new trial starts at phase 0 of a phase-onset row
+    params = [c for c in PARAMETER_COLUMNS if c in events]
+    if params:
+        trial_start = (events["phase"] == 0) & events[params].notna().any(axis=1)
+        trial_idx = trial_start.cumsum()
+        events[params] = events.groupby(trial_idx)[params].ffill()
+
+    for i, column in enumerate(ID_COLUMNS):
+        events.insert(i, column, session[column])
+    events["source"] = session["path"]
+    events["source_mtime"] = session["mtime"]
+    return events
+
+
+def _typed(events):
+    """Categoricals for low-cardinality text, text for mixed columns (e.g. response)."""
+    for column in CATEGORICAL_COLUMNS:
+        if column in events:
+            events[column] = events[column].astype(str).astype("category")
+    for column in events.columns[events.dtypes == object]:
+        events[column] = events[column].astype("string")
+    events["sess"] = events["sess"].astype(np.int8)
+    return events
+
+
+def load_cohort(root="logs", workers=None, cache=True):
+    """
+    All session logs under ``root`` as one table.
+
+    Parameters
+    ----------
+    root    : log directory (as created by main.py)
+    workers : processes reading logs (default: all cores)
+    cache   : read/update ``<root>/cohort_events.parquet``
+
+    Returns
+    -------
+    DataFrame with subject, sess, version, run, the events-log columns and
+    the source file of every row
+    """
+    sessions = discover_sessions(root)
+    cache_path = os.path.join(root, CACHE_NAME)
+
+    cached, todo = None, sessions
+    if cache and os.path.exists(cache_path):
+        cached = pd.read_parquet(cache_path)
+        # keep cached sessions whose file is still there and unchanged
+        current = dict(zip(sessions["path"], sessions["mtime"]))
+        fresh = (cached["source"].astype(str).map(current) == cached["source_mtime"]).to_numpy()
+        todo = sessions.loc[~sessions["path"].isin(set(cached.loc[fresh, "source"].astype(str)))]
+        if todo.empty and fresh.all():
+            return cached
+        cached = cached.loc[fresh]
+
+    parts = [] if cached is None else [cached]
+    if len(todo):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts.extend(pool.map(read_session, todo.to_dict("records")))
+    if not parts:
+        return pd.DataFrame(columns=ID_COLUMNS)
+
+    events = _typed(pd.concat(parts, ignore_index=True))
+    events = events.sort_values(ID_COLUMNS, kind="mergesort").reset_index(drop=True)
+    if cache:
+        events.to_parquet(cache_path, compression="zstd", index=False)
+    return events
+
+
+# =========================================================================
+# Views
+# =========================================================================
+
+def ratings(events):
+    """
+    Tidy ratings: one row per distress/coherence rating with its trial
+    parameters. A rating of 999 (scale never touched) is NaN, with
+    ``responded`` False.
+    """
+    is_rating = events["event_type"].isin(["distress_value", "coherence_value"])
+    out = events.loc[is_rating].copy()
+    out.insert(len(ID_COLUMNS), "scale",
+               out["event_type"].astype(str).str.replace("_value", "", regex=False).astype("category"))
+    value = pd.to_numeric(out["response"], errors="coerce")
+    out["responded"] = value.notna() & (value != 999)
+    out["rating"] = value.where(out["responded"])
+    keep = ID_COLUMNS + ["scale", "trial_nr", "onset", "rating", "responded"] + \
+        [c for c in PARAMETER_COLUMNS if c in out]
+    return out[keep].reset_index(drop=True)
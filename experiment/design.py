@@ -0,0 +1,458 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Experimental design of the Episodic Extinction experiment: phase structure,
+condition labels, randomisation and trial specs. Free of PsychoPy, so it can
+be used offline (e.g. by schedule.py) and in worker processes.
+"""
+
+import numpy as np
+import pandas as pd
+import os
+
+EXPERIMENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PHASES = {
+    "CS":               ("CS", 3.0),
+    "CS_distress":      ("CS_distress", 4.0),
+    "US":               ("US", 4.0),
+    "EXT":              ("fixcross", 4.0),
+    "coherence":        ("coherence", 4.0),
+    "reinforced_EXT":   ("fixcross", 4.0),  # duration defined per phase
+    "fixcross":         ("fixcross", (4,8)),
+    "fixcross_long":    ("fixcross", (8, 12)),
+}
+
+SESSION_CONFIG = {
+    1: dict(
+        base=["CS", "CS_distress", "US"],
+        coherence_last_block=True,
+    ),
+
+    2: dict(
+        CC=["CS", "CS_distress", "US"],
+        EXT=["CS", "CS_distress", "EXT"],
+        coherence_last_block=True,
+    ),
+
+    3: dict(
+        reinforced=["CS", "CS_distress", "US"],
+        EXT=["CS", "CS_distress", "EXT"],
+        coherence_last_block=False,
+    ),
+}
+
+# Constraints on the presentation order of every block (see pseudorandomize_stimset)
+SEQUENCE_CONSTRAINTS = dict(
+    max_run={"valence": 2},   # max consecutive episodes with the same value, per column
+    min_lag=0,                # min trials between repeats of an episode across blocks
+)
+
+def resolve_condition_label(sess: int, condition: int) -> str:
+    """
+    Maps (session, condition integer) to a condition label
+    used in SESSION_CONFIG.
+    """
+
+    if sess == 1:
+        return "base"
+
+    if sess == 2:
+        # uneven (1 of 5) → CC, even (2 of 4) → EXT
+        return "CC" if condition % 2 == 1 else "EXT"
+
+    if sess == 3:
+        # reinforced if condition == 6 OR uneven
+        if condition == 6 or condition % 2 == 1:
+            return "reinforced"
+        else:
+            return "EXT"
+
+    raise ValueError(f"Unknown session: {sess}")
+
+# functions for randomisation of trials
+def valid_orderings(orders, columns, max_run):
+    """
+    Vectorised run-length check of many candidate orderings at once.
+
+    Parameters
+    ----------
+    orders  : (n_orders, n) array of row indices, one candidate ordering per row
+    columns : dict of column name -> (n,) array of values (e.g. valence, condition, US)
+    max_run : maximum number of consecutive equal values, either one int for
+              all columns or a dict of column name -> int
+
+    Returns
+    -------
+    (n_orders,) boolean mask, True where an ordering satisfies every constraint
+    """
+    orders = np.atleast_2d(orders)
+    valid = np.ones(len(orders), dtype=bool)
+
+    for name, values in columns.items():
+        run = max_run[name] if isinstance(max_run, dict) else max_run
+        seq = np.asarray(values)[orders]
+        if seq.shape[1] <= run:
+            continue
+        # a run longer than `run` means `run` equal neighbours in a row
+        same = seq[:, 1:] == seq[:, :-1]
+        windows = np.lib.stride_tricks.sliding_window_view(same, run, axis=1)
+        valid &= ~windows.all(axis=2).any(axis=1)
+
+    return valid
+
+
+def is_valid_sequence(pool_df, max_run=None):
+    """Check if a trial pool has no more than 2 consecutive episodes of the same valence
+    (or, with ``max_run``, no longer runs than allowed per column)."""
+    if max_run is None:
+        max_run = {"valence": 2}
+    columns = {name: pool_df[name].to_numpy() for name in max_run}
+    return bool(valid_orderings(np.arange(len(pool_df)), columns, max_run)[0])
+
+
+def _screen_orders(columns, max_run, rng, lag_offset=None, min_lag=0,
+                   max_attempts=10000, batch_size=1024):
+    """
+    Draw random permutations in batches and return the first one that passes
+    ``valid_orderings`` (and the lag constraint), which is a uniform draw
+    from all valid orders.
+
+    Returns (order, n_screened), with order None if none of ``max_attempts``
+    permutations was valid.
+    """
+    n = len(next(iter(columns.values())))
+    screened = 0
+    while screened < max_attempts:
+        k = min(batch_size, max_attempts - screened)
+        perms = rng.permuted(np.tile(np.arange(n), (k, 1)), axis=1)
+        valid = valid_orderings(perms, columns, max_run)
+        if lag_offset is not None:
+            valid &= (lag_offset[perms] + np.arange(n) >= min_lag).all(axis=1)
+
+        hits = np.flatnonzero(valid)
+        if hits.size:
+            return perms[hits[0]], int(screened + hits[0] + 1)
+        screened += k
+    return None, screened
+
+
+def _construct_order(columns, max_run, rng, lag_offset=None, min_lag=0, max_attempts=10000):
+    """
+    Build one valid order of a trial pool by randomised backtracking.
+
+    Parameters
+    ----------
+    columns      : dict of column name -> integer codes, one per pool row
+    max_run      : dict of column name -> maximum number of consecutive equal values
+    rng          : numpy.random.Generator
+    lag_offset   : per-row distance (in trials) since the episode's last presentation,
+                   measured from the first position of this pool; None to skip the lag check
+    min_lag      : minimum distance between two presentations of an episode
+    max_attempts : maximum number of candidate placements to try
+
+    Returns
+    -------
+    (order, attempts) : row indices in presentation order, and the number of
+                        candidate placements that were tried
+    """
+    n = len(next(iter(columns.values())))
+    order = np.empty(n, dtype=int)
+    used = np.zeros(n, dtype=bool)
+    candidates = [None] * n
+    pointer = np.zeros(n, dtype=int)
+
+    def fits(row, pos):
+        for name, run in max_run.items():
+            values = columns[name]
+            if pos >= run and np.all(values[order[pos - run:pos]] == values[row]):
+                return False
+        if lag_offset is not None and lag_offset[row] + pos < min_lag:
+            return False
+        return True
+
+    attempts = 0
+    pos = 0
+    candidates[0] = rng.permutation(n)
+    while pos < n:
+        placed = False
+        while pointer[pos] < n:
+            row = candidates[pos][pointer[pos]]
+            pointer[pos] += 1
+            if used[row]:
+                continue
+            attempts += 1
+            if attempts > max_attempts:
+                raise RuntimeError(f"No valid order found after {max_attempts} placements")
+            if fits(row, pos):
+                order[pos] = row
+                used[row] = True
+                placed = True
+                break
+
+        if placed:
+            pos += 1
+            if pos < n:
+                candidates[pos] = rng.permutation(n)
+                pointer[pos] = 0
+        else:
+            # dead end: undo the previous placement and try its next candidate
+            pos -= 1
+            if pos < 0:
+                raise RuntimeError("No order satisfies the sequence constraints")
+            used[order[pos]] = False
+
+    return order, attempts
+
+
+def pseudorandomize_stimset(stimset, max_attempts=10000, seed=None,
+                            max_run=None, min_lag=0, previous=None):
+    """
+    Randomize stimset grouped by trial pools (1-6).
+    Within each block:
+    - Trial pool 1 comes first, then 2, then 3, etc.
+    - Within each trial pool, episodes are randomized
+    - Constraint: no more than ``max_run[col]`` consecutive episodes with the
+      same value of ``col`` (default: at most 2 of the same valence)
+    - Constraint: an episode is repeated no sooner than ``min_lag`` trials
+      after its presentation in ``previous`` (the preceding block's order)
+
+    Each pool first screens up to ``max_attempts`` random permutations in
+    batches with the vectorised ``valid_orderings`` (a uniform draw from the
+    valid orders). When constraints are too tight for that, the order is
+    constructed directly by randomised backtracking. The number of
+    permutations screened plus backtracking placements is stored in
+    ``result.attrs["randomisation_attempts"]``.
+    """
+    rng = np.random.default_rng(seed)
+    if max_run is None:
+        max_run = {"valence": 2}
+
+    # distance (in trials) from each episode's previous presentation to the end of that block
+    last_seen = {}
+    if previous is not None and min_lag > 0:
+        n_prev = len(previous)
+        last_seen = {ep: n_prev - pos for pos, ep in enumerate(previous["episode_nr"])}
+
+    # Group by trial pool
+    trial_pools = {trial_num: group.reset_index(drop=True) 
+                   for trial_num, group in stimset.groupby('trial', sort=True)}
+    
+    result_rows = []
+    total_attempts = 0
+    n_placed = 0
+    
+    # Process each trial pool in order (1, 2, 3, 4, 5, 6)
+    for trial_num in sorted(trial_pools.keys()):
+        pool_df = trial_pools[trial_num]
+
+        columns = {name: pd.factorize(pool_df[name])[0] for name in max_run}
+        lag_offset = None
+        if last_seen:
+            lag_offset = np.array([last_seen.get(ep, min_lag) + n_placed
+                                   for ep in pool_df["episode_nr"]])
+
+        order, attempts = _screen_orders(columns, max_run, rng,
+                                         lag_offset=lag_offset, min_lag=min_lag,
+                                         max_attempts=max_attempts)
+        if order is None:
+            try:
+                order, placements = _construct_order(columns, max_run, rng,
+                                                     lag_offset=lag_offset, min_lag=min_lag,
+                                                     max_attempts=max_attempts)
+            except RuntimeError as e:
+                raise RuntimeError(f"Could not generate valid sequence for trial pool {trial_num}: {e}")
+            attempts += placements
+
+        result_rows.append(pool_df.iloc[order].reset_index(drop=True))
+        total_attempts += attempts
+        n_placed += len(pool_df)
+    
+    # Concatenate all pools in order
+    final_df = pd.concat(result_rows, ignore_index=True)
+    final_df = final_df.copy()
+    final_df["presentation_order"] = range(1, len(final_df) + 1)
+    final_df.attrs["randomisation_attempts"] = total_attempts
+    
+    return final_df
+
+
+# blocks per session
+SESSION_BLOCKS = {
+    1: 3,
+    2: 4,
+    3: 1,
+}
+
+# break between blocks and "get ready" screen after it, in seconds
+BREAK_DURATION = 75
+TEST_MODE_BREAK_DURATION = 10
+GET_READY_DURATION = 5
+
+# durations are multiplied by these factors in test mode
+TEST_MODE_SCALE = 0.05
+US_TEST_MODE_SCALE = 0.01
+
+
+def practice_stimset_path():
+    """Path of the day 1 practice stimset."""
+    return os.path.join(EXPERIMENT_DIR, "Practice_stimsets", "day1_practice_stimset.tsv")
+
+
+def stimset_path(version, sess):
+    """Path of the main stimset of a version and session (day)."""
+    return os.path.join(EXPERIMENT_DIR, "Stimsets", f"version{version}_day{sess}.tsv")
+
+
+def make_trial_spec(trial_nr, phase_names, phase_durations, parameters):
+    """Lightweight description of a trial, materialised later by ExtinctionSession.build_trial()."""
+    return dict(
+        trial_nr=trial_nr,
+        phase_names=list(phase_names),
+        phase_durations=list(phase_durations),
+        parameters=parameters,
+    )
+
+
+def phases_for_trial(sess, condition_label, is_last_block, rng, test_mode=False):
+    """Get phase names and durations for a trial, based off the session and condition."""
+    cfg = SESSION_CONFIG[sess]
+
+    base_phases = cfg[condition_label].copy()
+
+    if is_last_block and cfg.get("coherence_last_block", False):
+        base_phases.append("coherence")
+        base_phases.append("fixcross")
+
+    else:
+        base_phases.append("fixcross_long")
+
+    phase_names = []
+    phase_durations = []
+
+    for phase_key in base_phases:
+        draw_name, duration = PHASES[phase_key]
+
+        if isinstance(duration, tuple):
+            lo, hi = duration
+            duration = int(rng.integers(lo, hi + 1))
+
+        if test_mode:
+            duration *= TEST_MODE_SCALE  # speed up for testing
+
+        phase_names.append(draw_name)
+        phase_durations.append(duration)
+
+    return dict(names=phase_names, durations=phase_durations)
+
+
+def practice_trial_specs(sess, practice_stimset, rng, test_mode=False):
+    """Specs of the practice trials (session 1), using the last-block phase structure."""
+    practice_trials = []
+
+    for trial_nr, stim_row in practice_stimset.iterrows():
+
+        params = stim_row.to_dict()
+        params["block"] = 0
+        params["practice"] = True
+
+        condition_label = resolve_condition_label(sess, int(stim_row["condition"]))
+        phases = phases_for_trial(sess, condition_label, is_last_block=True,
+                                  rng=rng, test_mode=test_mode)
+
+        practice_trials.append(make_trial_spec(
+            trial_nr=trial_nr,
+            phase_names=phases["names"],
+            phase_durations=phases["durations"],
+            parameters=params,
+        ))
+
+    return practice_trials
+
+
+def us_trial_specs(stimset, rng, test_mode=False):
+    """Specs of the US habituation block (session 1): each unique US followed by a fixation cross."""
+    us_trials = []
+
+    # Randomize order uniquely per block
+    randomized_stims = pseudorandomize_stimset(stimset, seed=rng)
+
+    # Get unique US stimuli from the stimset
+    unique_us = randomized_stims['US'].unique()
+    us_sounds = randomized_stims.groupby('US')['US_sound'].first()
+
+    phase_names = ['US', 'fixcross']
+
+    for trial_nr, us_stim in enumerate(unique_us):
+
+        # Set durations for habituation block
+        phase_durations = [4, int(rng.integers(5, 8))]  # US: 4s, fixcross: 5-7s
+
+        if test_mode:
+            phase_durations = [d * US_TEST_MODE_SCALE for d in phase_durations]
+
+        # Create parameters dict
+        params = {
+            'US': us_stim,
+            'US_sound': us_sounds[us_stim],
+            'CS': '',  # Not used in habituation
+            'block': 0,  # habituation block
+            'episode_nr': trial_nr + 1,
+            'condition': 0,
+            'valence': 0,
+        }
+
+        us_trials.append(make_trial_spec(
+            trial_nr=trial_nr,
+            phase_names=phase_names,
+            phase_durations=phase_durations,
+            parameters=params,
+        ))
+
+    return us_trials
+
+
+def block_trial_specs(sess, stimset, n_blocks, rng, test_mode=False, verbose=False):
+    """Specs of the main trials, one list per block, each block in a new pseudorandom order."""
+    trials_by_block = []
+    previous_block = None
+
+    for block in range(n_blocks):
+
+        is_last_block = (block == n_blocks - 1)
+
+        # Randomize order uniquely per block
+        randomized_stimset = pseudorandomize_stimset(
+            stimset,
+            seed=rng,
+            previous=previous_block,
+            **SEQUENCE_CONSTRAINTS
+        )
+        previous_block = randomized_stimset
+        if verbose:
+            print(f"Block {block + 1}: order found after "
+                  f"{randomized_stimset.attrs['randomisation_attempts']} candidates")
+
+        block_trials = []
+
+        for trial_nr, stim_row in randomized_stimset.iterrows():
+
+            params = stim_row.to_dict()
+            params["block"] = block + 1
+
+            condition_label = resolve_condition_label(sess, int(stim_row["condition"]))
+            phases = phases_for_trial(sess, condition_label, is_last_block,
+                                      rng=rng, test_mode=test_mode)
+
+            block_trials.append(make_trial_spec(
+                trial_nr=trial_nr,
+                phase_names=phases["names"],
+                phase_durations=phases["durations"],
+                parameters=params
+            ))
+
+        trials_by_block.append(block_trials)
+
+    return trials_by_block
@@ -0,0 +1,241 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+EyeLink EDF to HDF5 conversion jobs for the Episodic Extinction experiment.
+
+Conversion (hedfpy) runs outside the experiment: ExtinctionSession.close()
+starts it as a detached background process, or it is run later in batch
+on the analysis machine. Every EDF has a job status file next to it
+(``<output_str>.convert.json``), so interrupted or failed conversions are
+picked up again and finished ones are skipped.
+
+Usage:
+    python edf_convert.py [paths to .edf files or log directories] [--workers 4]
+                          [--force] [--status]
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from gaze_store import build_gaze_store
+import subprocess
+import argparse
+import json
+import sys
+import os
+
+# Conversion steps of one EDF, in order ("store": chunked gaze store, see gaze_store.py)
+STEPS = ["edf", "messages", "gaze", "store"]
+
+
+# =========================================================================
+# Job status
+# =========================================================================
+
+def status_path(edf_path):
+    return Path(edf_path).with_suffix(".convert.json")
+
+
+def read_status(edf_path):
+    """Job status of an EDF (state ``new`` if it was never converted)."""
+    path = status_path(edf_path)
+    if not path.exists():
+        return dict(edf=str(edf_path), state="new", steps_done=[])
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_status(edf_path, status):
+    status["updated"] = datetime.now().isoformat(timespec="seconds")
+    path = status_path(edf_path)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(status, f, indent=2)
+    os.replace(tmp, path)  # atomic, a crash never leaves a half-written status
+
+
+def _pid_alive(pid):
+    """True if process ``pid`` is still running."""
+    if pid is None:
+        return False
+    if sys.platform == "win32":
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def needs_conversion(edf_path, force=False):
+    """True if the EDF was never converted, failed, or was interrupted."""
+    status = read_status(edf_path)
+    if force:
+        return not (status["state"] == "running" and _pid_alive(status.get("pid")))
+    if status["state"] == "done":
+        return not Path(status["hdf5"]).exists()
+    if status["state"] == "running":
+        return not _pid_alive(status.get("pid"))
+    return True
+
+
+# =========================================================================
+# Conversion
+# =========================================================================
+
+def convert_edf(edf_path, hdf5_path=None):
+    """
+    Convert one EDF to HDF5 with hedfpy, updating its job status per step,
+    and build the chunked gaze store when the session's events log is there.
+
+    A partial HDF5 file of an interrupted run is removed first, since
+    hedfpy appends to existing files.
+
+    Returns
+    -------
+    Path of the HDF5 file
+    """
+    import hedfpy
+
+    edf_path = Path(edf_path)
+    hdf5_path = Path(hdf5_path) if hdf5_path is not None else edf_path.with_suffix(".hdf5")
+
+    status = dict(edf=str(edf_path), hdf5=str(hdf5_path), state="running", pid=os.getpid(),
+                  started=datetime.now().isoformat(timespec="seconds"), steps_done=[], error=None)
+    _write_status(edf_path, status)
+
+    try:
+        if hdf5_path.exists():
+            hdf5_path.unlink()
+
+        eyeOperator = hedfpy.HDFEyeOperator(str(hdf5_path))
+        events_path = edf_path.with_name(edf_path.stem + "_events.tsv")
+        steps = dict(
+            edf=lambda: eyeOperator.add_edf_file(str(edf_path)),
+            messages=eyeOperator.edf_message_data_to_hdf,
+            gaze=eyeOperator.edf_gaze_data_to_hdf,
+            store=lambda: build_gaze_store(str(hdf5_path), str(events_path)),
+        )
+        for step in STEPS:
+            if step == "store" and not events_path.exists():
+                continue
+            status["step"] = step
+            _write_status(edf_path, status)
+            steps[step]()
+            status["steps_done"].append(step)
+
+    except Exception as e:
+        status.update(state="failed", error=f"{type(e).__name__}: {e}")
+        _write_status(edf_path, status)
+        raise
+
+    status.update(state="done", step=None, finished=datetime.now().isoformat(timespec="seconds"))
+    _write_status(edf_path, status)
+    return hdf5_path
+
+
+def start_background(edf_path):
+    """
+    Start the conversion of one EDF in a detached process that outlives the
+    experiment; its output goes to ``<output_str>.convert.log``.
+    """
+    edf_path = Path(edf_path)
+    log = open(edf_path.with_suffix(".convert.log"), "a")
+    kwargs = {}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), str(edf_path)],
+                               stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                               **kwargs)
+    log.close()
+    return process
+
+
+# =========================================================================
+# Batch
+# =========================================================================
+
+def find_edfs(paths):
+    """EDF files among ``paths``; directories are searched recursively."""
+    edfs = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            edfs.extend(sorted(path.rglob("*.edf")))
+        elif path.suffix.lower() == ".edf":
+            edfs.append(path)
+    return edfs
+
+
+def _convert_job(edf_path):
+    return str(convert_edf(edf_path))
+
+
+def run_jobs(edfs, workers=None, force=False):
+    """Convert all EDFs that need it, ``workers`` at a time; prints progress."""
+    todo = [edf for edf in edfs if needs_conversion(edf, force)]
+    print(f"{len(edfs) - len(todo)} of {len(edfs)} EDF files already converted or in progress")
+
+    failed = []
+    if len(todo) == 1 or workers == 1:
+        # no pool for a single job (e.g. the background conversion started at close)
+        for i, edf in enumerate(todo, 1):
+            try:
+                print(f"[{i}/{len(todo)}] {_convert_job(edf)}")
+            except Exception as e:
+                failed.append(edf)
+                print(f"[{i}/{len(todo)}] FAILED {edf}: {e}")
+        return failed
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_convert_job, edf): edf for edf in todo}
+        for i, future in enumerate(as_completed(futures), 1):
+            edf = futures[future]
+            try:
+                print(f"[{i}/{len(todo)}] {future.result()}")
+            except Exception as e:
+                failed.append(edf)
+                print(f"[{i}/{len(todo)}] FAILED {edf}: {e}")
+    return failed
+
+
+def print_status(edfs):
+    for edf in edfs:
+        status = read_status(edf)
+        step = f" ({status['step']})" if status.get("step") else ""
+        print(f"{status['state']:>8}{step:<12} {edf}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert EyeLink EDF files to HDF5.")
+    parser.add_argument("paths", nargs="*", default=[os.path.join(".", "logs")],
+                        help=".edf files or directories to search (default: ./logs)")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="reconvert finished files")
+    parser.add_argument("--status", action="store_true", help="only print the job status")
+    args = parser.parse_args()
+
+    edfs = find_edfs(args.paths)
+    if args.status:
+        print_status(edfs)
+        return
+
+    failed = run_jobs(edfs, workers=args.workers, force=args.force)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
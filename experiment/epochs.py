@@ -0,0 +1,202 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Phase-aligned epochs of pupil/gaze data for the Episodic Extinction experiment.
+
+Epochs are cut from the gaze store of a session (gaze_store.py): all
+epochs of a session are gathered with one ``searchsorted`` over the
+sample timestamps and one fancy-indexing step, giving a
+(trials x time x channel) array. Blinks are interpolated on the
+continuous signal and baselines subtracted per epoch, both vectorised.
+
+Example:
+    from epochs import extract_epochs
+    data, times, meta = extract_epochs("sub-01_ses-2_v-5_gaze.h5", align="CS",
+                                       channels=["L_pupil"], tmin=-0.5, tmax=4.0)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from gaze_store import GazeStore, phase_events
+import numpy as np
+import pandas as pd
+import os
+
+
+# =========================================================================
+# Signal helpers
+# =========================================================================
+
+def blink_mask(pupil, pad=50):
+    """
+    Samples in or near a blink: pupil size 0 or NaN (EyeLink's blink
+    signature), widened by ``pad`` samples on both sides.
+    """
+    bad = ~(pupil > 0)
+    if not pad or not bad.any():
+        return bad
+    # dilate with a running sum over a window of 2 * pad + 1 samples
+    counts = np.convolve(bad.astype(np.int32), np.ones(2 * pad + 1, dtype=np.int32), mode="same")
+    return counts > 0
+
+
+def interpolate(signal, mask):
+    """Linearly interpolate ``signal`` (1-D) over masked samples."""
+    signal = np.asarray(signal, dtype=np.float32).copy()
+    if not mask.any() or mask.all():
+        return signal
+    idx = np.arange(len(signal))
+    signal[mask] = np.interp(idx[mask], idx[~mask], signal[~mask])
+    return signal
+
+
+def baseline_correct(data, times, window=(-0.5, 0.0), mode="subtract"):
+    """
+    Baseline-correct epochs in place.
+
+    Parameters
+    ----------
+    data   : (trials, time, channel) array
+    times  : epoch time axis in seconds
+    window : (start, end) of the baseline in seconds, relative to onset
+    mode   : 'subtract' (data - baseline) or 'percent' (% change from baseline)
+    """
+    in_window = (times >= window[0]) & (times < window[1])
+    base = np.nanmean(data[:, in_window, :], axis=1, keepdims=True)
+    if mode == "subtract":
+        data -= base
+    elif mode == "percent":
+        data /= base
+        data -= 1
+        data *= 100
+    else:
+        raise ValueError(f"Unknown baseline mode {mode!r}")
+    return data
+
+
+def sample_period(time, n=10000):
+    """
+    Sample period in ms from the first ``n`` EyeLink timestamps; recording
+    gaps are ignored, and at 2000 Hz (repeated ms timestamps) it is 0.5.
+    """
+    diffs = np.diff(time[:n + 1])
+    if len(diffs) == 0:
+        return 1.0
+    in_recording = diffs <= max(1, 2 * np.median(diffs))
+    return float(np.mean(diffs[in_recording]))
+
+
+def nearest_samples(time, targets):
+    """Index of the sample closest in time to each target (``time`` sorted)."""
+    if len(time) == 1:
+        return np.zeros(np.shape(targets), dtype=np.int64)
+    right = np.searchsorted(time, targets)
+    np.clip(right, 1, len(time) - 1, out=right)
+    left = right - 1
+    return np.where(targets - time[left] <= time[right] - targets, left, right)
+
+
+# =========================================================================
+# Epoching
+# =========================================================================
+
+def extract_epochs(store_path, align="CS", channels=("L_pupil",), tmin=-0.5, tmax=3.0,
+                   baseline=(-0.5, 0.0), baseline_mode="subtract",
+                   interpolate_blinks=True, blink_channel=None, blink_pad=50):
+    """
+    Cut epochs aligned to the onset of every ``align`` phase of a session.
+
+    Parameters
+    ----------
+    store_path         : gaze store (``<output_str>_gaze.h5``)
+    align              : phase name(s) whose onsets epochs are aligned to (e.g. 'CS', 'US')
+    channels           : channels to epoch (see GazeStore.channels)
+    tmin, tmax         : epoch window in seconds relative to onset
+    baseline           : baseline window in seconds, or None for no correction
+    baseline_mode      : 'subtract' or 'percent'
+    interpolate_blinks : interpolate all channels over blinks before epoching
+    blink_channel      : pupil channel blinks are detected on (default: first *pupil* channel)
+    blink_pad          : samples masked around every blink
+
+    Returns
+    -------
+    data  : float32 array (trials, time, channel); NaN outside the recording
+    times : epoch time axis in seconds
+    meta  : one row per epoch (phase table, plus the events-log row of the
+            phase if the events log is next to the store)
+    """
+    align = [align] if isinstance(align, str) else list(align)
+    channels = list(channels)
+
+    with GazeStore(store_path) as gaze:
+        phases = gaze.phases
+        selected = phases.loc[phases["phase_name"].isin(align)]
+        n_samples = len(gaze)
+        if selected.empty or n_samples == 0:
+            return np.empty((0, 0, len(channels)), np.float32), np.empty(0), selected.reset_index(drop=True)
+
+        time = gaze.time
+        period = sample_period(time)
+        sfreq = 1000.0 / period
+        offsets = np.arange(int(round(tmin * sfreq)), int(round(tmax * sfreq)))
+        targets = selected["el_start"].to_numpy()[:, None] + offsets * period
+
+        idx = nearest_samples(time, targets)
+        # timestamps are whole ms, so allow at least 0.5 ms at sampling rates above 1000 Hz;
+        # False in recording gaps and outside the recording
+        valid = np.abs(time[idx] - targets) <= max(period, 1.0) / 2
+
+        # read the sample range covering all epochs in one go (plus some context for interpolation)
+        margin = 10 * blink_pad if interpolate_blinks else 0
+        lo = max(int(idx.min()) - margin, 0)
+        hi = min(int(idx.max()) + 1 + margin, n_samples)
+        signal = gaze.read_channels(channels, lo, hi)
+
+        if interpolate_blinks:
+            if blink_channel is None:
+                blink_channel = next(c for c in gaze.channels if "pupil" in c.lower())
+            pupil = gaze.read_channels([blink_channel], lo, hi)[:, 0]
+            mask = blink_mask(pupil, pad=blink_pad)
+            signal = np.stack([interpolate(signal[:, j], mask) for j in range(len(channels))], axis=1)
+
+        data = signal[idx - lo]                 # (trials, time, channel) in one gather
+        data[~valid] = np.nan
+
+    times = offsets / sfreq
+    if baseline is not None:
+        baseline_correct(data, times, baseline, baseline_mode)
+
+    meta = selected.reset_index(drop=True)
+    events_path = str(store_path)[:-len("_gaze.h5")] + "_events.tsv"
+    if str(store_path).endswith("_gaze.h5") and os.path.exists(events_path):
+        events = phase_events(pd.read_csv(events_path, sep="\t"))
+        params = events.iloc[meta["seq"].to_numpy()].reset_index(drop=True)
+        meta = meta.join(params.drop(columns=[c for c in params if c in meta]))
+
+    return data, times, meta
+
+
+def _epoch_job(args):
+    path, kwargs = args
+    data, times, meta = extract_epochs(path, **kwargs)
+    meta.insert(0, "session", os.path.basename(path).replace("_gaze.h5", ""))
+    return data, times, meta
+
+
+def extract_cohort_epochs(store_paths, workers=None, **kwargs):
+    """
+    Epochs of many sessions, extracted in parallel and stacked along the
+    trial axis; ``meta`` gets a ``session`` column (output_str). Keyword
+    arguments go to ``extract_epochs``.
+    """
+    jobs = [(str(path), kwargs) for path in store_paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = [r for r in pool.map(_epoch_job, jobs) if len(r[0])]
+
+    if not results:
+        return np.empty((0, 0, len(kwargs.get("channels", ("L_pupil",)))), np.float32), np.empty(0), pd.DataFrame()
+    times = results[0][1]
+    data = np.concatenate([r[0] for r in results], axis=0)
+    meta = pd.concat([r[2] for r in results], ignore_index=True)
+    return data, times, meta
@@ -0,0 +1,352 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Event logging for the Episodic Extinction experiment.
+
+Events are kept in memory (EventLog) and merged into exptools2's
+global_log at close(). During the session they are also streamed to
+``<output_str>_events.partial.jsonl`` (EventStream), one JSON object per
+line, so a crashed session can be recovered:
+
+    python event_log.py logs/sub-01/sub-01_ses-2_v-5/sub-01_ses-2_v-5_events.partial.jsonl
+
+The keypress-by-keypress trajectories of all ratings are kept apart from
+the events (TrajectoryStore) and saved to ``<output_str>_rating_trajectories.npz``.
+"""
+
+from queue import Queue, Empty, Full
+import numpy as np
+import pandas as pd
+import threading
+import argparse
+import numbers
+import json
+import os
+
+# events-log rows that are not phase onsets (no duration, see exptools2's Session.close())
+NON_PHASE_EVENTS = ["response", "trigger", "pulse"]
+
+
+class EventLog:
+    """
+    Columnar, preallocated event log with amortised O(1) appends.
+
+    Replaces per-cell ``global_log.loc[idx, col] = ...`` writes during
+    trials. Each column is a NumPy array that doubles in size when full;
+    columns are created on first use and back-filled with NaN. Nothing
+    touches pandas until ``to_frame()`` is called at the end of the session.
+
+    Parameters
+    ----------
+    capacity : initial number of rows (default 4096)
+    stream   : optional EventStream every event is also handed to
+    """
+
+    def __init__(self, capacity=4096, stream=None):
+        self._columns = {}
+        self._capacity = capacity
+        self._n = 0
+        self.stream = stream
+
+    # ── Helpers ───────────────────────────────────────────────────────
+
+    @staticmethod
+    def _is_numeric(value):
+        return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+    def _add_column(self, name, value):
+        dtype = np.float64 if self._is_numeric(value) else object
+        self._columns[name] = np.full(self._capacity, np.nan, dtype=dtype)
+
+    def _grow(self):
+        self._capacity *= 2
+        for name, col in self._columns.items():
+            new = np.full(self._capacity, np.nan, dtype=col.dtype)
+            new[:self._n] = col[:self._n]
+            self._columns[name] = new
+
+    # ── Public API ────────────────────────────────────────────────────
+
+    def append(self, **fields):
+        """Append one event; columns not given are left as NaN."""
+        if self._n == self._capacity:
+            self._grow()
+
+        for name, value in fields.items():
+            col = self._columns.get(name)
+            if col is None:
+                self._add_column(name, value)
+                col = self._columns[name]
+            elif col.dtype != object and not self._is_numeric(value):
+                col = col.astype(object)
+                self._columns[name] = col
+            col[self._n] = value
+
+        self._n += 1
+        if self.stream is not None:
+            self.stream.put(fields)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def column(self, name):
+        """View of the filled part of a column."""
+        return self._columns[name][:self._n]
+
+    def close(self):
+        """Write the remaining streamed events and close the stream."""
+        if self.stream is not None:
+            self.stream.close()
+
+    def to_frame(self):
+        """Convert the log to a DataFrame (once, at the end of the session)."""
+        return pd.DataFrame({name: col[:self._n] for name, col in self._columns.items()})
+
+    def merge_into(self, global_log):
+        """Return ``global_log`` with all logged events added, in onset order."""
+        return _merge(global_log, self.to_frame())
+
+
+def _merge(global_log, events):
+    if global_log is None or global_log.empty:
+        merged = events.reindex(columns=list(dict.fromkeys(
+            [*([] if global_log is None else global_log.columns), *events.columns])))
+    else:
+        merged = pd.concat([global_log, events], ignore_index=True)
+    if "onset" in merged:
+        merged = merged.sort_values("onset", kind="mergesort")
+    return merged.reset_index(drop=True)
+
+
+def finalise_log(global_log, exp_start, exp_stop, nr_frames):
+    """
+    Bookkeeping exptools2's Session.close() does before writing the events
+    log: trial_nr as index, absolute onsets, phase durations and per-phase
+    frame counts (responses have neither), rounded onsets.
+    """
+    log = global_log.set_index("trial_nr")
+    log["onset_abs"] = log["onset"] + exp_start
+
+    phases = ~log["event_type"].isin(NON_PHASE_EVENTS)
+    if phases.any():
+        onsets = log.loc[phases, "onset"].to_numpy(dtype=float)
+        log.loc[phases, "duration"] = np.append(np.diff(onsets), exp_stop - onsets[-1])
+        frames = log.loc[phases, "nr_frames"].to_numpy()
+        log.loc[phases, "nr_frames"] = np.append(frames[1:], nr_frames).astype(int)
+
+    return log.round({"onset": 5, "onset_abs": 5, "duration": 5})
+
+
+# =========================================================================
+# Rating trajectories
+# =========================================================================
+
+class TrajectoryStore:
+    """
+    Keypress trajectories of all rating phases of a session, as ragged arrays.
+
+    The times and values of all phases are stored back to back in two
+    growing arrays; phase ``i`` occupies ``offsets[i]:offsets[i + 1]``.
+    ``add()`` is called once per rating phase with the scale's trajectory
+    buffer and copies it in with one slice assignment.
+
+    Parameters
+    ----------
+    capacity : initial number of keypresses (default 4096)
+    """
+
+    def __init__(self, capacity=4096):
+        self._times = np.empty(capacity, dtype=np.float64)
+        self._values = np.empty(capacity, dtype=np.float32)
+        self._n = 0
+        self.offsets = [0]
+        self.phases = {name: [] for name in ("scale", "trial_nr", "block", "phase", "onset")}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def add(self, scale, times, values, trial_nr, block, phase, onset):
+        """Append the trajectory (``times``, ``values``) of one rating phase."""
+        n = len(times)
+        if self._n + n > len(self._times):
+            capacity = max(2 * len(self._times), self._n + n)
+            self._times = np.resize(self._times, capacity)
+            self._values = np.resize(self._values, capacity)
+        self._times[self._n:self._n + n] = times
+        self._values[self._n:self._n + n] = values
+        self._n += n
+
+        self.offsets.append(self._n)
+        for name, value in zip(self.phases, (scale, trial_nr, block, phase, onset)):
+            self.phases[name].append(np.nan if value is None else value)
+
+    def save(self, path):
+        """Write all trajectories to a compressed ``.npz`` file (see load_trajectories)."""
+        np.savez_compressed(
+            path,
+            times=self._times[:self._n],
+            values=self._values[:self._n],
+            offsets=np.asarray(self.offsets, dtype=np.int64),
+            scale=np.asarray(self.phases["scale"], dtype=str),
+            trial_nr=np.asarray(self.phases["trial_nr"], dtype=np.float64),
+            block=np.asarray(self.phases["block"], dtype=np.float64),
+            phase=np.asarray(self.phases["phase"], dtype=np.float64),
+            onset=np.asarray(self.phases["onset"], dtype=np.float64),
+        )
+
+
+def load_trajectories(path):
+    """
+    Rating trajectories saved by TrajectoryStore, one row per keypress:
+    phase_idx (rating phase, in order), scale, trial_nr, block, t
+    (session time), rt (from the phase onset), press (1, 2, ...) and value.
+    """
+    with np.load(path) as f:
+        data = {name: f[name] for name in f.files}
+    offsets = data["offsets"]
+    counts = np.diff(offsets)
+    idx = np.repeat(np.arange(len(counts)), counts)
+    return pd.DataFrame({
+        "phase_idx": idx,
+        "scale": data["scale"][idx],
+        "trial_nr": data["trial_nr"][idx],
+        "block": data["block"][idx],
+        "phase": data["phase"][idx],
+        "t": data["times"],
+        "rt": data["times"] - data["onset"][idx],
+        "press": np.arange(len(idx)) - offsets[idx] + 1,
+        "value": data["values"],
+    })
+
+
+# =========================================================================
+# Streaming
+# =========================================================================
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+class EventStream:
+    """
+    Append-only JSON-lines copy of the event log, written during the session.
+
+    ``put()`` only hands the event to a bounded queue; a background thread
+    writes queued events in batches (at most ``batch_size`` events, or
+    whatever arrived within ``flush_interval`` seconds) and flushes the file
+    to disk after every batch, so a crash loses at most the last batch. If
+    the disk stalls and the queue fills up, further events are counted as
+    dropped from the stream rather than blocking the render thread; they
+    are still in the in-memory EventLog and the final events log.
+
+    Parameters
+    ----------
+    path           : output file (``<output_str>_events.partial.jsonl``)
+    batch_size     : events per write (default 64)
+    flush_interval : seconds before a partial batch is written (default 0.5)
+    max_queue      : events waiting to be written before events are dropped (default 10000)
+    """
+
+    def __init__(self, path, batch_size=64, flush_interval=0.5, max_queue=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+
+        self._file = open(path, "a", encoding="utf-8")
+        self._queue = Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._worker, name="EventStream", daemon=True)
+        self._thread.start()
+
+    def put(self, fields):
+        """Queue one event (a dict of column values) without blocking."""
+        try:
+            self._queue.put_nowait(fields)
+        except Full:
+            self.dropped += 1
+
+    def _worker(self):
+        done = False
+        while not done:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            if None in batch:
+                batch = batch[:batch.index(None)]
+                done = True
+            if batch:
+                self._file.write("".join(json.dumps(fields, default=_json_default) + "\n"
+                                         for fields in batch))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self.written += len(batch)
+
+    def close(self):
+        """Write the queued events and close the file."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._file.close()
+        if self.dropped:
+            print(f"Event stream: {self.dropped} events not streamed (queue full), "
+                  f"they are in the final events log")
+
+
+# =========================================================================
+# Recovery
+# =========================================================================
+
+def recover_events(path):
+    """
+    Events of a streamed (partial) session as a DataFrame, in onset order.
+
+    A last line cut off by the crash is skipped.
+    """
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return _merge(None, pd.DataFrame(rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recover the events log of a crashed session.")
+    parser.add_argument("path", help="<output_str>_events.partial.jsonl")
+    parser.add_argument("--out", default=None,
+                        help="output file (default <output_str>_events.recovered.tsv)")
+    args = parser.parse_args()
+
+    events = recover_events(args.path)
+    if events.empty:
+        print(f"No events in {args.path}")
+        return
+    out = args.out or args.path.replace("_events.partial.jsonl", "_events.recovered.tsv")
+    # session end unknown: the last phase gets no duration
+    log = finalise_log(events, 0.0, events["onset"].iloc[-1], 0)
+    log.loc[log["onset"] == log["onset"].max(), "duration"] = np.nan
+    log.to_csv(out, sep="\t", index=True)
+    print(f"Recovered {len(events)} events to {out}")
+
+
+if __name__ == '__main__':
+    main()
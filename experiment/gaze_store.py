@@ -0,0 +1,301 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Chunked, compressed HDF5 store of gaze samples for the Episodic Extinction experiment.
+
+Layout of ``<output_str>_gaze.h5`` (PyTables):
+
+    /time      int64 EArray (n_samples,)              EyeLink timestamps (ms)
+    /samples   float32 EArray (n_samples, n_channels)  gaze, pupil, velocity, ...
+               attribute ``channels``: channel names, in column order
+    /phases    Table, one row per trial phase:
+               seq, trial_nr, block, phase, phase_name, episode_nr,
+               onset (session time), el_start, el_stop, i_start, i_stop
+
+Samples of all recording blocks are stored back to back in time order,
+in blosc-compressed chunks of about two seconds, so reading one phase
+(``i_start:i_stop``) decompresses only the few chunks it overlaps. The
+phase table is small and is read in full to look phases up.
+
+Built from the hedfpy HDF5 file and the session's events log; every phase
+onset in the events log sends one tracker message carrying its trial_nr
+and phase, and the two are matched on those (see ``match_phases``).
+
+Usage:
+    python gaze_store.py <hdf5 from hedfpy> <events.tsv> [--out <output_str>_gaze.h5]
+"""
+
+import numpy as np
+import pandas as pd
+import argparse
+import os
+
+# Rows per compressed chunk (about 2 s at 1000 Hz)
+CHUNK_ROWS = 2048
+COMPRESSION = dict(complevel=5, complib="blosc:lz4", shuffle=True)
+
+# events-log rows that are not phase onsets (no tracker message)
+NON_PHASE_EVENTS = ("response", "trigger", "pulse")
+NON_PHASE_SUFFIXES = ("_value", "_stim")
+
+
+def _phase_description():
+    import tables
+
+    class Phase(tables.IsDescription):
+        seq = tables.Int32Col(pos=0)
+        trial_nr = tables.Int32Col(pos=1)
+        block = tables.Int32Col(pos=2)
+        phase = tables.Int16Col(pos=3)
+        phase_name = tables.StringCol(24, pos=4)
+        episode_nr = tables.Int32Col(pos=5)
+        onset = tables.Float64Col(pos=6)
+        el_start = tables.Int64Col(pos=7)
+        el_stop = tables.Int64Col(pos=8)
+        i_start = tables.Int64Col(pos=9)
+        i_stop = tables.Int64Col(pos=10)
+
+    return Phase
+
+
+# =========================================================================
+# Building
+# =========================================================================
+
+def phase_events(events):
+    """Phase-onset rows of an events log (already in presentation order)."""
+    is_phase = ~events["event_type"].isin(NON_PHASE_EVENTS) \
+        & ~events["event_type"].astype(str).str.endswith(NON_PHASE_SUFFIXES)
+    return events.loc[is_phase].reset_index(drop=True)
+
+
+def _int(value, missing=-1):
+    return missing if value is None or pd.isna(value) else int(value)
+
+
+def _hedfpy_keys(store):
+    """
+    Sample block keys and the trial_phases key of a hedfpy file.
+
+    hedfpy writes the sample blocks with pandas but trial_phases as a
+    native PyTables table, which ``store.keys()`` leaves out by default.
+    """
+    keys = store.keys()
+    blocks = sorted((k for k in keys if k.rsplit("/", 1)[-1].startswith("block_")),
+                    key=lambda k: int(k.rsplit("_", 1)[-1]))
+    phases = [k for k in keys + store.keys(include="native") if k.endswith("/trial_phases")]
+    if not phases:
+        raise ValueError(f"{store.filename} has no trial_phases table; "
+                         f"was it converted from an EDF with phase messages?")
+    return blocks, phases[0]
+
+
+def match_phases(event_keys, el_keys):
+    """
+    Pair phase onsets of the events log with tracker phase messages.
+
+    Both are (trial_nr, phase) sequences in time order. Pairs are made in
+    order on equal keys; a phase without a message, or a message without a
+    phase, is skipped (with a warning) when the next key on the other side
+    matches. Any other disagreement raises a ValueError, rather than pairing
+    later phases with the wrong trial.
+
+    Returns
+    -------
+    event_idx, el_idx : int arrays of matched positions in both sequences
+    """
+    event_idx, el_idx = [], []
+    missing, extra = [], []
+    i = j = 0
+    while i < len(event_keys) and j < len(el_keys):
+        if event_keys[i] == el_keys[j]:
+            event_idx.append(i)
+            el_idx.append(j)
+            i += 1
+            j += 1
+        elif i + 1 < len(event_keys) and event_keys[i + 1] == el_keys[j]:
+            missing.append(event_keys[i])
+            i += 1
+        elif j + 1 < len(el_keys) and event_keys[i] == el_keys[j + 1]:
+            extra.append(el_keys[j])
+            j += 1
+        else:
+            raise ValueError(f"Events log and EDF disagree at phase {i} of the events log: "
+                             f"(trial_nr, phase) {event_keys[i]} vs. message {el_keys[j]}")
+    missing += event_keys[i:]
+    extra += el_keys[j:]
+
+    if missing:
+        print(f"Warning: no phase message in the EDF for {len(missing)} phases "
+              f"(trial_nr, phase): {missing[:5]}{' ...' if len(missing) > 5 else ''}")
+    if extra:
+        print(f"Warning: {len(extra)} phase messages in the EDF without a phase in the events log "
+              f"(trial_nr, phase): {extra[:5]}{' ...' if len(extra) > 5 else ''}")
+    return np.asarray(event_idx, dtype=np.int64), np.asarray(el_idx, dtype=np.int64)
+
+
+def build_gaze_store(hdf5_path, events_path, out_path=None):
+    """
+    Write the gaze store of one session.
+
+    Parameters
+    ----------
+    hdf5_path   : HDF5 file written by hedfpy (edf_convert.py)
+    events_path : the session's ``_events.tsv``
+    out_path    : output file (default ``<output_str>_gaze.h5`` next to the events log)
+
+    Returns
+    -------
+    Path of the gaze store
+    """
+    import tables
+
+    if out_path is None:
+        out_path = events_path.replace("_events.tsv", "_gaze.h5")
+
+    events = phase_events(pd.read_csv(events_path, sep="\t"))
+
+    tmp_path = out_path + ".tmp"
+    with pd.HDFStore(hdf5_path, "r") as source, tables.open_file(tmp_path, "w") as h5:
+        block_keys, phases_key = _hedfpy_keys(source)
+        filters = tables.Filters(**COMPRESSION)
+
+        time_arr = samples = None
+        for key in block_keys:
+            block = source[key]
+            channels = [c for c in block.columns
+                        if c != "time" and pd.api.types.is_numeric_dtype(block[c])]
+            if samples is None:
+                time_arr = h5.create_earray("/", "time", tables.Int64Atom(), (0,),
+                                            filters=filters, chunkshape=(CHUNK_ROWS,))
+                samples = h5.create_earray("/", "samples", tables.Float32Atom(),
+                                           (0, len(channels)), filters=filters,
+                                           chunkshape=(CHUNK_ROWS, len(channels)))
+                samples.attrs.channels = channels
+            time_arr.append(block["time"].to_numpy(dtype=np.int64))
+            samples.append(block[samples.attrs.channels].to_numpy(dtype=np.float32))
+            del block
+
+        time = time_arr[:] if time_arr is not None else np.empty(0, dtype=np.int64)
+
+        # tracker phase messages, in order; matched to the events log on (trial_nr, phase)
+        el_phases = source[phases_key].sort_values("trial_phase_EL_timestamp", kind="mergesort")
+        el_keys = list(zip(el_phases["trial_phase_trial"].astype(int), el_phases["trial_phase_index"].astype(int)))
+        event_keys = list(zip(events["trial_nr"].astype(int), events["phase"].astype(int)))
+        event_idx, el_idx = match_phases(event_keys, el_keys)
+        n = len(event_idx)
+
+        el_start = el_phases["trial_phase_EL_timestamp"].to_numpy(dtype=np.int64)[el_idx]
+        if n:
+            el_stop = np.append(el_start[1:], time[-1] + 1 if len(time) else el_start[-1])
+        else:
+            el_stop = np.empty(0, dtype=np.int64)
+        i_start = np.searchsorted(time, el_start)
+        i_stop = np.searchsorted(time, el_stop)
+
+        table = h5.create_table("/", "phases", _phase_description(), expectedrows=n)
+        row = table.row
+        for i in range(n):
+            event = events.iloc[event_idx[i]]
+            row["seq"] = event_idx[i]
+            row["trial_nr"] = event["trial_nr"]
+            row["block"] = _int(event.get("block"))
+            row["phase"] = event["phase"]
+            row["phase_name"] = str(event["event_type"]).encode()
+            row["episode_nr"] = _int(event.get("episode_nr"))
+            row["onset"] = event["onset"]
+            row["el_start"] = el_start[i]
+            row["el_stop"] = el_stop[i]
+            row["i_start"] = i_start[i]
+            row["i_stop"] = i_stop[i]
+            row.append()
+        table.flush()
+        for col in ("trial_nr", "block", "phase"):
+            table.colinstances[col].create_csindex()
+
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+# =========================================================================
+# Reading
+# =========================================================================
+
+class GazeStore:
+    """
+    Read access to a gaze store; use as a context manager.
+
+    Examples
+    --------
+    with GazeStore("sub-01_ses-2_v-5_gaze.h5") as gaze:
+        cs = gaze.read_phase(trial_nr=3, phase=0, block=2)   # one CS phase, as a DataFrame
+        cs_phases = gaze.phases.query("phase_name == 'CS'")
+    """
+
+    def __init__(self, path):
+        import tables
+        self._h5 = tables.open_file(path, "r")
+        self.channels = list(self._h5.root.samples.attrs.channels)
+        self.phases = pd.DataFrame(self._h5.root.phases.read())
+        self.phases["phase_name"] = self.phases["phase_name"].str.decode("utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._h5.close()
+
+    def __len__(self):
+        return self._h5.root.time.nrows
+
+    @property
+    def time(self):
+        """EyeLink timestamps of all samples (int64, ms)."""
+        return self._h5.root.time[:]
+
+    def read_channels(self, channels, i_start=None, i_stop=None):
+        """Samples ``i_start:i_stop`` of the named channels, as a (samples, channels) array."""
+        cols = [self.channels.index(c) for c in channels]
+        return self._h5.root.samples[i_start:i_stop][:, cols]
+
+    def read(self, i_start, i_stop, as_frame=True):
+        """Samples ``i_start:i_stop``; a DataFrame indexed by EyeLink time, or (time, samples)."""
+        time = self._h5.root.time[i_start:i_stop]
+        samples = self._h5.root.samples[i_start:i_stop]
+        if not as_frame:
+            return time, samples
+        return pd.DataFrame(samples, columns=self.channels, index=pd.Index(time, name="time"))
+
+    def select(self, **criteria):
+        """Rows of the phase table matching all ``column=value`` criteria."""
+        mask = np.ones(len(self.phases), dtype=bool)
+        for column, value in criteria.items():
+            mask &= (self.phases[column] == value).to_numpy()
+        return self.phases.loc[mask]
+
+    def read_phase(self, as_frame=True, **criteria):
+        """Samples of the one phase matching ``criteria`` (e.g. trial_nr, phase, block)."""
+        rows = self.select(**criteria)
+        if len(rows) != 1:
+            raise ValueError(f"{len(rows)} phases match {criteria}, expected 1 "
+                             f"(add block, or select by seq)")
+        row = rows.iloc[0]
+        return self.read(int(row["i_start"]), int(row["i_stop"]), as_frame=as_frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the chunked gaze store of a session.")
+    parser.add_argument("hdf5", help="HDF5 file written by hedfpy")
+    parser.add_argument("events", help="the session's _events.tsv")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    print(build_gaze_store(args.hdf5, args.events, args.out))
+
+
+if __name__ == '__main__':
+    main()
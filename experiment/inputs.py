@@ -0,0 +1,155 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Keyboard input for the Episodic Extinction experiment.
+
+Key presses come from a key source that timestamps every key when it is
+pressed, not when the frame loop gets to it: PsychoPy's Keyboard with
+the psychtoolbox backend queues keys on a separate thread with the time
+of the key event. The InputRouter drains the source once per frame, in
+one batch, and logs, forwards (to the active rating scale) and acts on
+the keys (quit, scanner trigger), replacing exptools2's get_events().
+
+For headless runs (simulation.py) the SyntheticKeySource produces
+scripted or simulated key presses with the same interface.
+"""
+
+import heapq
+
+
+# =========================================================================
+# Key sources
+# =========================================================================
+
+class KeyboardSource:
+    """
+    Key presses from PsychoPy's event-driven Keyboard.
+
+    With the psychtoolbox backend keys are timestamped at the key event,
+    on ``clock``; without psychtoolbox, PsychoPy falls back to its event
+    module, where keys are timestamped when they are polled (as before).
+
+    Parameters
+    ----------
+    clock : clock key times are reported on (the session clock)
+    keys  : keys to report (default: all)
+    """
+
+    def __init__(self, clock, keys=None):
+        from psychopy.hardware import keyboard
+        self.clock = clock
+        self.keys = keys
+        self._keyboard = keyboard.Keyboard(clock=clock)
+        self.backend = getattr(keyboard.Keyboard, "backend", "unknown")
+
+    def get_keys(self, trial=None, now=None):
+        """All key presses since the last call, as (key, time) tuples."""
+        return [(press.name, press.rt)
+                for press in self._keyboard.getKeys(keyList=self.keys, waitRelease=False)]
+
+    def clear(self):
+        """Discard queued key presses (e.g. those made during a text screen)."""
+        self._keyboard.clearEvents()
+
+
+class SyntheticKeySource:
+    """
+    Key presses from a script or a simulated participant, for running without a keyboard.
+
+    Parameters
+    ----------
+    feed : optional callable ``(trial, now) -> [(key, time), ...]`` polled
+           on every call, e.g. a simulation Responder's ``poll``
+    """
+
+    backend = "synthetic"
+
+    def __init__(self, feed=None):
+        self.feed = feed
+        self._pending = []     # heap of (time, seq, key)
+        self._seq = 0
+
+    def push(self, key, t):
+        """Schedule a key press at session time ``t``."""
+        heapq.heappush(self._pending, (t, self._seq, key))
+        self._seq += 1
+
+    def get_keys(self, trial=None, now=None):
+        """Key presses due by ``now`` (pushed or from the feed), in time order."""
+        keys = []
+        while self._pending and (now is None or self._pending[0][0] <= now):
+            t, _, key = heapq.heappop(self._pending)
+            keys.append((key, t))
+        if self.feed is not None and trial is not None:
+            keys.extend(self.feed(trial, now))
+            keys.sort(key=lambda press: press[1])
+        return keys
+
+    def clear(self):
+        self._pending.clear()
+
+
+# =========================================================================
+# Routing
+# =========================================================================
+
+class InputRouter:
+    """
+    Handles the key presses of a session, once per frame.
+
+    Every key is logged (event_type 'response', or 'pulse' for the scanner
+    trigger, as exptools2 does), sent to the eye tracker if it is on, and
+    forwarded with its timestamp to the trial's active rating scale. Keys
+    pressed before the rating phase started do not move its scale.
+
+    Parameters
+    ----------
+    source   : KeyboardSource or SyntheticKeySource
+    quit_key : key that closes and quits the session (default 'q', as in exptools2)
+    """
+
+    def __init__(self, source, quit_key="q"):
+        self.source = source
+        self.quit_key = quit_key
+
+    def clear(self):
+        self.source.clear()
+
+    def dispatch(self, trial):
+        """Drain the key source and handle its keys for ``trial``; returns the (key, time) tuples."""
+        session = trial.session
+        keys = self.source.get_keys(trial, session.clock.getTime())
+        if not keys:
+            return keys
+
+        if any(key == self.quit_key for key, _ in keys):
+            session.close()
+            session.quit()
+
+        trigger = getattr(session, "mri_trigger", None)
+        scale = trial._active_scale
+        phase_onset = trial.phase_onset
+        params = trial.log_parameters()
+
+        for key, t in keys:
+            event_type = "pulse" if key == trigger else "response"
+            session.event_log.append(
+                trial_nr=trial.trial_nr,
+                onset=t,
+                event_type=event_type,
+                phase=trial.phase,
+                response=key,
+                **params
+            )
+            if trial.eyetracker_on:
+                session.tracker.sendMessage(
+                    f"start_type-{event_type}_trial-{trial.trial_nr}_phase-{trial.phase}_key-{key}_time-{t}")
+
+            if event_type == "response":
+                trial.last_resp, trial.last_resp_onset = key, t
+                if scale is not None and (phase_onset is None or t >= phase_onset):
+                    scale.handle_key(key, t)
+
+        return keys
@@ -0,0 +1,112 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Pre-rendered screen layers for the Episodic Extinction experiment.
+"""
+
+from collections import OrderedDict
+from psychopy import visual
+
+
+class LayerCache:
+    """
+    Cache of static screen layers captured into BufferImageStims.
+
+    A layer is the static part of a composite frame (e.g. CS + fixation +
+    scale box, bar, ticks and labels) rendered once into an offscreen
+    texture, so each frame blits one image instead of drawing every
+    primitive. Layers are keyed by what they show (phase, stimulus, scale):
+    a different phase or stimulus gives a different key, and the least
+    recently used layers are dropped beyond ``max_layers``.
+
+    Capturing clears the back buffer, so build layers before anything else
+    is drawn in a frame, preferably during the ITI (see ``prepare()``).
+
+    Parameters
+    ----------
+    win        : psychopy.visual.Window
+    max_layers : number of layers kept (default 6)
+    """
+
+    def __init__(self, win, max_layers=6):
+        self.win = win
+        self.max_layers = max_layers
+        self._layers = OrderedDict()
+        self.builds = 0
+
+    def _build(self, key, stims):
+        layer = visual.BufferImageStim(self.win, stim=list(stims))
+        self._layers[key] = layer
+        self.builds += 1
+        while len(self._layers) > self.max_layers:
+            self._layers.popitem(last=False)
+        return layer
+
+    def get(self, key, stims):
+        """Return the layer for ``key``, capturing ``stims`` (a sequence of stimuli) on a miss."""
+        layer = self._layers.get(key)
+        if layer is None:
+            return self._build(key, stims)
+        self._layers.move_to_end(key)
+        return layer
+
+    def prepare(self, key, stims):
+        """Capture a layer ahead of time (no-op if it is cached already)."""
+        if key not in self._layers:
+            self._build(key, stims)
+
+    def invalidate(self, key=None):
+        """Drop one layer, or all layers if ``key`` is None."""
+        if key is None:
+            self._layers.clear()
+        else:
+            self._layers.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._layers
+
+
+class PageCache(LayerCache):
+    """
+    Full-screen text pages (instructions, breaks) laid out and captured once.
+
+    Laying out a long instruction text is slow; a page is rendered into a
+    BufferImageStim the first time it is needed, or ahead of time with
+    ``prepare()``, and every later showing is a single blit. Pages are keyed
+    by text, formatting and window size, so pages differing only in a
+    formatted value (e.g. ``{block}``) are cached separately.
+
+    Parameters
+    ----------
+    win       : psychopy.visual.Window
+    max_pages : number of pages kept (default 32)
+    font      : font of all pages (default Arial)
+    """
+
+    def __init__(self, win, max_pages=32, font="Arial"):
+        super().__init__(win, max_layers=max_pages)
+        self.font = font
+
+    def page_key(self, text, height=28, color="black"):
+        return ("page", text, height, color, self.font, tuple(int(x) for x in self.win.size))
+
+    def _text_stim(self, key):
+        _, text, height, color, font, size = key
+        return (visual.TextStim(self.win, text=text, height=height, color=color, font=font,
+                                wrapWidth=0.9 * size[0]),)
+
+    def page(self, text, height=28, color="black"):
+        """The rendered page of ``text``, laid out and captured on a miss."""
+        key = self.page_key(text, height, color)
+        if key in self:
+            return self.get(key, ())
+        return self._build(key, self._text_stim(key))
+
+    def prepare_pages(self, texts, height=28, color="black"):
+        """Render pages ahead of time, e.g. at startup (capturing clears the back buffer)."""
+        for text in texts:
+            key = self.page_key(text, height, color)
+            if key not in self:
+                self._build(key, self._text_stim(key))
@@ -8,7 +8,10 @@ Main script to run the Episodic Extinction experiment.
 
 import sys
 import os
+from backends import import_core
+import_core()  # psychopy, exptools2, pandas, ... one by one, for the import-time report at startup
 from session import ExtinctionSession
+from schedule import schedule_path
 from datetime import datetime
 datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
@@ -28,12 +31,18 @@ def main():
     
     settings_file='./expsettings.yml'
 
+    # replay a precompiled schedule (python schedule.py ...) if there is one
+    schedule_file = schedule_path('./schedules', subject, sess, version)
+    if not os.path.exists(schedule_file):
+        schedule_file = None
+
     ts = ExtinctionSession(
         output_str=output_str, 
         output_dir=output_dir, 
         settings_file=settings_file,
         sess=int(sess),
-        version=version
+        version=version,
+        schedule_file=schedule_file
         )
     ts.run()
 
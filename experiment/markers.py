@@ -0,0 +1,195 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Hardware event markers for the Episodic Extinction experiment.
+"""
+
+from queue import SimpleQueue, Empty
+from backends import import_timed
+import threading
+import time
+import csv
+
+
+# =========================================================================
+# Ports
+# =========================================================================
+
+class SerialMarkerPort:
+    """Markers as single bytes on a serial port (no reset needed)."""
+
+    name = "serial"
+    needs_reset = False
+
+    def __init__(self, port="COM3", baudrate=115200):
+        serial = import_timed("serial")
+        self._port = serial.Serial(port, baudrate=baudrate)
+
+    def write(self, code):
+        self._port.write(bytearray([code]))
+
+    def reset(self):
+        pass
+
+    def close(self):
+        self._port.close()
+
+
+class ParallelMarkerPort:
+    """Markers as pulses on the data lines of a parallel port, reset to 0 after the pulse."""
+
+    name = "parallel"
+    needs_reset = True
+
+    def __init__(self, address="0x3FF8"):
+        parallel = import_timed("psychopy.parallel")
+        self._port = parallel.ParallelPort(address=address)
+
+    def write(self, code):
+        self._port.setData(code)
+
+    def reset(self):
+        self._port.setData(0)
+
+    def close(self):
+        pass
+
+
+class LoopbackPort:
+    """
+    Fake port that records every write and reset, for testing without hardware.
+
+    Parameters
+    ----------
+    write_delay : seconds every write blocks, to mimic a slow device (default 0)
+    needs_reset : behave as a pulsed (parallel) port (default True)
+    """
+
+    name = "loopback"
+
+    def __init__(self, write_delay=0.0, needs_reset=True):
+        self.write_delay = write_delay
+        self.needs_reset = needs_reset
+        self.state = 0
+        self.history = []     # (perf_counter time, value) per write and reset
+
+    def write(self, code):
+        if self.write_delay:
+            time.sleep(self.write_delay)
+        self.state = code
+        self.history.append((time.perf_counter(), code))
+
+    def reset(self):
+        self.state = 0
+        self.history.append((time.perf_counter(), 0))
+
+    def close(self):
+        pass
+
+
+# =========================================================================
+# Dispatcher
+# =========================================================================
+
+class MarkerDispatcher:
+    """
+    Sends markers from a dedicated thread, timestamped at the flip.
+
+    ``on_flip()`` is registered with ``win.callOnFlip()``: it only reads the
+    clock and puts the marker on a ``queue.SimpleQueue``, so no port I/O
+    happens on the render thread. The worker thread writes every marker to
+    all ports, logs the flip-to-write latency and resets pulsed ports after
+    ``pulse_width`` seconds on its own timer.
+
+    Parameters
+    ----------
+    ports       : ports to write to (SerialMarkerPort, ParallelMarkerPort, LoopbackPort)
+    pulse_width : seconds before pulsed ports are reset to 0 (default 0.01)
+    clock       : callable returning the time markers are stamped with,
+                  e.g. the session clock's getTime
+    """
+
+    columns = ["trial_nr", "phase", "code", "port", "t_flip", "t_write", "latency", "t_reset"]
+
+    def __init__(self, ports, pulse_width=0.01, clock=time.perf_counter):
+        self.ports = list(ports)
+        self.pulse_width = pulse_width
+        self.clock = clock
+
+        self.markers = []          # one dict per marker and port, see ``columns``
+        self._queue = SimpleQueue()
+        self._thread = threading.Thread(target=self._worker, name="MarkerDispatcher", daemon=True)
+        self._thread.start()
+
+    def on_flip(self, code, trial_nr=None, phase=None):
+        """Stamp a marker with the current (flip) time and hand it to the worker."""
+        self._queue.put((code, self.clock(), trial_nr, phase))
+
+    def send(self, code, trial_nr=None, phase=None):
+        """Send a marker now, without waiting for a flip."""
+        self.on_flip(code, trial_nr=trial_nr, phase=phase)
+
+    # ── Worker ────────────────────────────────────────────────────────
+
+    def _worker(self):
+        reset_due = None       # perf_counter deadline of the pending pulse reset
+        pending = []           # records waiting for their reset time
+
+        while True:
+            timeout = None if reset_due is None else max(reset_due - time.perf_counter(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except Empty:
+                item = False   # timer expired
+
+            if reset_due is not None and (item is False or time.perf_counter() >= reset_due):
+                self._reset(pending)
+                reset_due, pending = None, []
+
+            if item is None:
+                if reset_due is not None:
+                    time.sleep(max(reset_due - time.perf_counter(), 0))
+                    self._reset(pending)
+                return
+            if item is False:
+                continue
+
+            code, t_flip, trial_nr, phase = item
+            for port in self.ports:
+                port.write(code)
+                t_write = self.clock()
+                record = dict(trial_nr=trial_nr, phase=phase, code=code, port=port.name,
+                              t_flip=t_flip, t_write=t_write, latency=t_write - t_flip,
+                              t_reset=float("nan"))
+                self.markers.append(record)
+                if port.needs_reset:
+                    pending.append((port, record))
+            if pending:
+                # a new pulse overrides the previous one; reset pulse_width after it
+                reset_due = time.perf_counter() + self.pulse_width
+
+    def _reset(self, pending):
+        for port in dict.fromkeys(port for port, _ in pending):
+            port.reset()
+        t_reset = self.clock()
+        for _, record in pending:
+            record["t_reset"] = t_reset
+
+    # ── Output ────────────────────────────────────────────────────────
+
+    def close(self):
+        """Send the remaining markers, reset the ports and stop the worker."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        for port in self.ports:
+            port.close()
+
+    def save(self, path):
+        """Write one row per marker and port to a tab-separated file."""
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.columns, delimiter="\t")
+            writer.writeheader()
+            writer.writerows(self.markers)
@@ -0,0 +1,193 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Offline compiler of session schedules for the Episodic Extinction experiment.
+
+For every subject/version/day a complete, seeded, per-trial schedule is
+written to a Parquet file: trial order, phase names, jittered phase
+durations and expected onsets. ExtinctionSession replays such a file
+(memory-mapped) instead of randomising at startup.
+
+Usage:
+    python schedule.py --subjects 1-200 --pad 3 [--versions 1-10] [--days 1 2 3]
+                       [--out ./schedules] [--workers 8]
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from design import (SESSION_BLOCKS, BREAK_DURATION, GET_READY_DURATION, TEST_MODE_SCALE,
+                    US_TEST_MODE_SCALE, practice_stimset_path, stimset_path, make_trial_spec,
+                    practice_trial_specs, us_trial_specs, block_trial_specs)
+import numpy as np
+import pandas as pd
+import argparse
+import hashlib
+import json
+import os
+
+def schedule_seed(subject, version, sess):
+    """Deterministic seed of a subject/version/day."""
+    digest = hashlib.sha256(f"sub-{subject}_ses-{sess}_v-{version}".encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+def schedule_path(out_dir, subject, sess, version):
+    """Path of a schedule, next to the layout main.py uses for logs."""
+    output_str = f"sub-{subject}_ses-{sess}_v-{version}"
+    return os.path.join(out_dir, f"sub-{subject}", f"{output_str}_schedule.parquet")
+
+
+def _native(value):
+    """NumPy scalars to plain Python values, so Parquet keeps ints as ints."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def compile_schedule(subject, version, sess):
+    """
+    Build the full schedule of one session.
+
+    Returns
+    -------
+    (rows, meta) : one dict per trial in presentation order, and the
+                   schedule metadata (seed, blocks, expected run time, ...)
+    """
+    seed = schedule_seed(subject, version, sess)
+    rng = np.random.default_rng(seed)
+    stimset = pd.read_csv(stimset_path(version, sess), sep="\t")
+
+    parts = []
+    if sess == 1:
+        parts.append(("us_habituation", [us_trial_specs(stimset, rng)]))
+        practice_stimset = pd.read_csv(practice_stimset_path(), sep="\t")
+        parts.append(("practice", [practice_trial_specs(sess, practice_stimset, rng)]))
+    parts.append(("main", block_trial_specs(sess, stimset, SESSION_BLOCKS[sess], rng)))
+
+    rows = []
+    param_keys = {}
+    onset = 0.0
+    for part, blocks in parts:
+        for block_idx, block in enumerate(blocks):
+            if part == "main" and block_idx > 0:
+                onset += BREAK_DURATION + GET_READY_DURATION
+
+            for spec in block:
+                params = {k: _native(v) for k, v in spec["parameters"].items()}
+                param_keys.setdefault(part, list(params))
+                duration = float(sum(spec["phase_durations"]))
+                rows.append(dict(
+                    part=part,
+                    trial_nr=int(spec["trial_nr"]),
+                    phase_names=spec["phase_names"],
+                    phase_durations=[float(d) for d in spec["phase_durations"]],
+                    trial_duration=duration,
+                    expected_onset=onset,
+                    **params
+                ))
+                onset += duration
+
+    meta = dict(
+        subject=str(subject),
+        version=str(version),
+        sess=int(sess),
+        seed=seed,
+        n_blocks=SESSION_BLOCKS[sess],
+        total_duration=onset,   # trials and breaks, excluding self-paced instruction screens
+        param_keys=param_keys,
+    )
+    return rows, meta
+
+
+def write_schedule(rows, meta, path):
+    """Write a compiled schedule to Parquet, with its metadata in the schema."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # parts have different parameters: use the union of columns, None where absent
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    table = pa.Table.from_pydict({key: [row.get(key) for row in rows] for key in columns})
+    table = table.replace_schema_metadata({"schedule": json.dumps(meta)})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(table, path, compression="zstd")
+
+
+def load_schedule(path, test_mode=False):
+    """
+    Memory-map a schedule and turn it back into trial specs.
+
+    Returns
+    -------
+    dict with keys ``us_habituation`` and ``practice`` (lists of specs),
+    ``blocks`` (one list of specs per block) and ``meta``
+    """
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path, memory_map=True)
+    meta = json.loads(table.schema.metadata[b"schedule"])
+
+    schedule = dict(us_habituation=[], practice=[],
+                    blocks=[[] for _ in range(meta["n_blocks"])], meta=meta)
+
+    for row in table.to_pylist():
+        part = row["part"]
+        params = {k: row[k] for k in meta["param_keys"][part]}
+
+        durations = row["phase_durations"]
+        if test_mode:
+            scale = US_TEST_MODE_SCALE if part == "us_habituation" else TEST_MODE_SCALE
+            durations = [d * scale for d in durations]
+
+        spec = make_trial_spec(row["trial_nr"], row["phase_names"], durations, params)
+        if part == "main":
+            schedule["blocks"][params["block"] - 1].append(spec)
+        else:
+            schedule[part].append(spec)
+
+    return schedule
+
+
+def _compile_job(job):
+    subject, version, sess, out_dir = job
+    rows, meta = compile_schedule(subject, version, sess)
+    path = schedule_path(out_dir, subject, sess, version)
+    write_schedule(rows, meta, path)
+    return path, meta["total_duration"]
+
+
+def parse_list(items, pad=0):
+    """Expand '1-3' ranges and plain items into a list of (zero-padded) strings."""
+    out = []
+    for item in items:
+        for part in str(item).split(","):
+            if "-" in part:
+                lo, hi = part.split("-")
+                out.extend(str(i).zfill(pad) for i in range(int(lo), int(hi) + 1))
+            elif part:
+                out.append(part.zfill(pad))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile seeded session schedules.")
+    parser.add_argument("--subjects", nargs="+", required=True, help="e.g. 1-200 or 001 002")
+    parser.add_argument("--pad", type=int, default=0, help="zero-pad subject numbers to this width")
+    parser.add_argument("--versions", nargs="+", default=["1-10"])
+    parser.add_argument("--days", nargs="+", type=int, default=[1, 2, 3])
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "schedules"))
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    args = parser.parse_args()
+
+    jobs = [(subject, version, sess, args.out)
+            for subject in parse_list(args.subjects, args.pad)
+            for version in parse_list(args.versions)
+            for sess in args.days]
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for path, total in pool.map(_compile_job, jobs, chunksize=8):
+            print(f"{path}: {total / 60:.1f} min")
+
+    print(f"Compiled {len(jobs)} schedules into {args.out}")
+
+
+if __name__ == '__main__':
+    main()
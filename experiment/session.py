@@ -7,124 +7,28 @@ Session class for Episodic Extinction experiment.
 """
 
 from exptools2.core import PylinkEyetrackerSession #Set on if eyetracker is used, otherwise use Session
-from exptools2.core import Session
-from trial import ExtinctionTrial
+from trial import ExtinctionTrial, STIM_DIR, stimulus_paths, make_rating_scales
+from stimuli import TextureCache, AudioPool, ImageDecoder
+from event_log import EventLog, EventStream, TrajectoryStore
+from inputs import InputRouter, KeyboardSource
+from layers import LayerCache, PageCache
+from timing import FrameTimer, FrameScheduler
+from markers import MarkerDispatcher, SerialMarkerPort, ParallelMarkerPort, LoopbackPort
+from design import (SESSION_BLOCKS, phases_for_trial, practice_trial_specs, us_trial_specs,
+                    block_trial_specs, practice_stimset_path, stimset_path, BREAK_DURATION,
+                    TEST_MODE_BREAK_DURATION, GET_READY_DURATION)
+from schedule import load_schedule
+from settings import load_settings, load_instructions
+from backends import load_backends, import_report
+from edf_convert import convert_edf, start_background
 import numpy as np
 import pandas as pd
 from psychopy import core, visual, event, logging
-import random
+from collections import deque
 # from psychopy.core import getMouse
 import os
 import sys
-import yaml
-import serial
 from pathlib import Path
-import hedfpy
-
-PHASES = {
-    "CS":               ("CS", 3.0),
-    "CS_distress":      ("CS_distress", 4.0),
-    "US":               ("US", 4.0),
-    "EXT":              ("fixcross", 4.0),
-    "coherence":        ("coherence", 4.0),
-    "reinforced_EXT":   ("fixcross", 4.0),  # duration defined per phase
-    "fixcross":         ("fixcross", (4,8)),
-    "fixcross_long":    ("fixcross", (8, 12)),
-}
-
-SESSION_CONFIG = {
-    1: dict(
-        base=["CS", "CS_distress", "US"],
-        coherence_last_block=True,
-    ),
-
-    2: dict(
-        CC=["CS", "CS_distress", "US"],
-        EXT=["CS", "CS_distress", "EXT"],
-        coherence_last_block=True,
-    ),
-
-    3: dict(
-        reinforced=["CS", "CS_distress", "US"],
-        EXT=["CS", "CS_distress", "EXT"],
-        coherence_last_block=False,
-    ),
-}
-
-def resolve_condition_label(sess: int, condition: int) -> str:
-    """
-    Maps (session, condition integer) to a condition label
-    used in SESSION_CONFIG.
-    """
-
-    if sess == 1:
-        return "base"
-
-    if sess == 2:
-        # uneven (1 of 5) → CC, even (2 of 4) → EXT
-        return "CC" if condition % 2 == 1 else "EXT"
-
-    if sess == 3:
-        # reinforced if condition == 6 OR uneven
-        if condition == 6 or condition % 2 == 1:
-            return "reinforced"
-        else:
-            return "EXT"
-
-    raise ValueError(f"Unknown session: {sess}")
-
-# functions for randomisation of trials
-# checking function for two conditions and three valence
-def is_valid_sequence(pool_df):
-    """Check if a trial pool has no more than 2 consecutive episodes of the same valence."""
-    for i in range(len(pool_df) - 2):
-        if (
-            pool_df["valence"].iloc[i]
-            == pool_df["valence"].iloc[i + 1]
-            == pool_df["valence"].iloc[i + 2]
-        ):
-            return False
-    return True
-
-
-def pseudorandomize_stimset(stimset, max_attempts=10000, seed=None):
-    """
-    Randomize stimset grouped by trial pools (1-6).
-    Within each block:
-    - Trial pool 1 comes first, then 2, then 3, etc.
-    - Within each trial pool, episodes are randomized
-    - Constraint: no more than 2 consecutive episodes of the same valence
-    """
-    if seed is not None:
-        random.seed(seed)
-
-    # Group by trial pool
-    trial_pools = {trial_num: group.reset_index(drop=True) 
-                   for trial_num, group in stimset.groupby('trial', sort=True)}
-    
-    result_rows = []
-    
-    # Process each trial pool in order (1, 2, 3, 4, 5, 6)
-    for trial_num in sorted(trial_pools.keys()):
-        pool_df = trial_pools[trial_num].copy()
-        
-        # Randomize within the pool until valid
-        for attempt in range(max_attempts):
-            shuffled_pool = pool_df.sample(frac=1).reset_index(drop=True)
-            
-            if is_valid_sequence(shuffled_pool):
-                result_rows.append(shuffled_pool)
-                break
-        else:
-            raise RuntimeError(f"Could not generate valid sequence for trial pool {trial_num} after {max_attempts} attempts")
-    
-    # Concatenate all pools in order
-    final_df = pd.concat(result_rows, ignore_index=True)
-    final_df = final_df.copy()
-    final_df["presentation_order"] = range(1, len(final_df) + 1)
-    
-    return final_df
-
 
 class ExtinctionSession(PylinkEyetrackerSession):
     """
@@ -133,6 +37,9 @@ class ExtinctionSession(PylinkEyetrackerSession):
     instructions, and data collection.
     """
 
+    # Trial class built from the trial specs (the simulator swaps in a headless one)
+    trial_class = ExtinctionTrial
+
     def __init__(self,
                  output_str,
                  output_dir=None,
@@ -144,7 +51,8 @@ class ExtinctionSession(PylinkEyetrackerSession):
                  blocks=3,
                  enable_eyetracker=False,
                  enable_serial_markers=False,
-                 enable_parallel_markers=False):
+                 enable_parallel_markers=False,
+                 schedule_file=None):
         """
         Initialize ExtinctionSession.
 
@@ -156,51 +64,118 @@ class ExtinctionSession(PylinkEyetrackerSession):
             Directory for output files
         settings_file : str, optional
             Path to settings file
+        schedule_file : str, optional
+            Precompiled schedule (see schedule.py) to replay instead of
+            randomising trial orders and durations at startup
         """
-        # Load the settings now, since we need them as a parameter to load ourselves.
-        tempSettings = Session(output_str=output_str, output_dir=output_dir, settings_file=settings_file).settings
+        # Parse and validate the settings before any window exists; we need them as a parameter to load ourselves.
+        settings = load_settings(settings_file)
+
+        # Import only the hardware backends the settings enable (fails here, before the window, if one is missing)
+        self.backends = load_backends(settings)
+        print(import_report())
 
         super().__init__(
             output_str,
             output_dir=output_dir,
             settings_file=settings_file,
-            eyetracker_on = tempSettings["test_settings"]["eyetracker_on"])
+            eyetracker_on = settings["test_settings"]["eyetracker_on"])
 
+        self._init_experiment(sess, version, schedule_file)
+
+    def _init_experiment(self, sess, version, schedule_file=None):
+        """
+        Experiment state on top of an initialised exptools2 session (window,
+        clock, settings): timing, stimuli, ports, stimulus sets and schedule.
+
+        Kept apart from __init__ so the headless SimulatedSession
+        (simulation.py) can reuse it without opening a window.
+        """
         # Hide mouse cursor based on settings
         self.win.mouseVisible = self.settings["mouse"]["visible"]
 
+        # Phase onsets and ratings are appended here during trials and merged
+        # into global_log once, at close(); meanwhile they are streamed to
+        # <output_str>_events.partial.jsonl so a crashed session can be recovered
+        os.makedirs(self.output_dir, exist_ok=True)
+        stream = None
+        if self.settings.get("logging", {}).get("stream_events", True):
+            stream = EventStream(os.path.join(self.output_dir, f"{self.output_str}_events.partial.jsonl"))
+        self.event_log = EventLog(stream=stream)
+
+        # Value and time of every rating keypress, flushed from the scales once per rating phase
+        self.trajectories = TrajectoryStore()
+
+        # Key presses timestamped at the key event, drained and routed once per frame
+        self.inputs = InputRouter(self.key_source())
+
+        # Refresh interval measured by exptools2 at window creation (fallback 60 Hz)
+        frame_rate = getattr(self, "actual_framerate", None) or self.win.getActualFrameRate() or 60.0
+        self.frame_dur = 1.0 / frame_rate
+
+        # Frame-locked phase scheduling on session time, reset at the start of every trial sequence
+        self.scheduler = FrameScheduler(self.frame_dur)
+
+        # Opt-in flip-time recording with a per-phase timing report
+        timing_settings = self.settings.get("frame_timing", {})
+        self.frame_timer = None
+        if timing_settings.get("log_on", False):
+            self.frame_timer = FrameTimer(self.frame_dur,
+                                          capacity=timing_settings.get("buffer_size", 2 ** 16))
+
+        # Shared CS/US textures: one ImageStim per unique image, LRU-evicted within budget.
+        # Images of upcoming trials are decoded on worker threads and uploaded during fixcross.
+        stim_settings = self.settings.get("stimuli", {})
+        self.decoder = ImageDecoder(n_workers=stim_settings.get("decode_workers", 2))
+        self.decode_ahead = stim_settings.get("decode_ahead", 4)
+        self.textures = TextureCache(
+            self.win,
+            max_bytes=stim_settings.get("texture_cache_mb", 512) * 1024 ** 2,
+            decoder=self.decoder,
+        )
+
         if sys.platform == 'win32':
             from ctypes import windll
 
+        # Event markers are stamped at the flip and written to the ports on a separate thread
+        marker_ports = []
+
         # Open serial port
         self.enable_serial_markers = self.settings["test_settings"]["serial_markers_on"]
         if self.enable_serial_markers:
-            self.serialPort = serial.Serial("COM3", baudrate=115200)
+            marker_ports.append(SerialMarkerPort("COM3", baudrate=115200))
 
         self.enable_parallel_markers = self.settings["test_settings"]["parallel_markers_on"]
         if self.enable_parallel_markers:
             currentDir = os.path.dirname(os.path.realpath(__file__))
             windll.LoadLibrary(currentDir + "/inpoutx64.dll")     # uncomment when running on Windows and using parallel port, make sure to have the inpoutx64.dll in the same directory as this script
-            from psychopy import parallel
-            self.parallelPort = parallel.ParallelPort(address='0x3FF8')
+            marker_ports.append(ParallelMarkerPort(address='0x3FF8'))
+
+        # Fake port, to test the marker pipeline without hardware
+        if self.settings["test_settings"].get("loopback_markers_on", False):
+            marker_ports.append(LoopbackPort())
+
+        self.markers = None
+        if marker_ports:
+            self.markers = MarkerDispatcher(
+                marker_ports,
+                pulse_width=self.settings.get("markers", {}).get("pulse_width", 0.01),
+                clock=self.clock.getTime,
+            )
 
         self.sess = sess  # Store session number
         self.version = version  # Store version number
         self.test_mode = self.settings["test_settings"]["test_mode_on"]  # Store test mode flag
 
         # blocks per session
-        self.session_to_blocks = {
-        1: 3,
-        2: 4,
-        3: 1,
-        }
-
-        self.break_duration = 75  # default break duration in seconds, can be overridden by instructions
-        self.get_ready_duration = 5  # default get ready duration in seconds, can be overridden by instructions
+        self.session_to_blocks = SESSION_BLOCKS
+
+        self.break_duration = BREAK_DURATION  # default break duration in seconds, can be overridden by instructions
+        self.get_ready_duration = GET_READY_DURATION  # default get ready duration in seconds, can be overridden by instructions
         
         if self.test_mode:
-            self.break_duration = 10  # shorter break duration in test mode
-            self.get_ready_duration = 5  # shorter get ready duration in test mode
+            self.break_duration = TEST_MODE_BREAK_DURATION  # shorter break duration in test mode
+            self.get_ready_duration = GET_READY_DURATION  # shorter get ready duration in test mode
 
         try:
             self.blocks = self.session_to_blocks[self.sess]
@@ -208,21 +183,11 @@ class ExtinctionSession(PylinkEyetrackerSession):
             print(f"Error: Session {self.sess} is not defined. Please provide a valid session number (1, 2, or 3).")
             sys.exit(1)
 
-        instructions_path = os.path.join(
-            os.path.dirname(__file__),
-            "Instructions.yml",)
-
-        with open(instructions_path, 'r') as file:
-            self.instructions = yaml.safe_load(file)
+        self.instructions = load_instructions(sessions=[self.sess])
 
         #load stimulus set based on version and session
         #load day 1 practice stimset, to be done prior to start of session 1
-        practice_stimset_path = os.path.join(
-            os.path.dirname(__file__),
-            "Practice_stimsets",
-            "day1_practice_stimset.tsv"
-        )
-        self.practice_stimset = pd.read_csv(practice_stimset_path, sep="\t")
+        self.practice_stimset = pd.read_csv(practice_stimset_path(), sep="\t")
         practice_phase_names = ["CS", "CS_distress", "US", "coherence", "fixcross"]
 
         if self.practice_stimset.empty:
@@ -234,27 +199,57 @@ class ExtinctionSession(PylinkEyetrackerSession):
         #     "stimuli_list_test.tsv"
         # )
 
-        stimset_path = os.path.join(
-            os.path.dirname(__file__),
-            "Stimsets",
-            f"version{self.version}_day{self.sess}.tsv"
-        )
-
-        self.stimset = pd.read_csv(stimset_path, sep="\t")
+        self.stimset = pd.read_csv(stimset_path(self.version, self.sess), sep="\t")
         self.n_trials = len(self.stimset)
 
+        # Trial orders and jittered durations are drawn from this generator,
+        # unless a precompiled schedule is replayed
+        self.rng = np.random.default_rng()
+        self.schedule = None
+        if schedule_file is not None:
+            self.schedule = load_schedule(schedule_file, test_mode=self.test_mode)
+            if len(self.schedule["blocks"]) != self.blocks:
+                raise RuntimeError(f"Schedule {schedule_file} has {len(self.schedule['blocks'])} blocks, "
+                                   f"session {self.sess} needs {self.blocks}")
+            print(f"Replaying schedule {schedule_file}")
+
+        # Rating scales are built once and shared by all trials
+        self.distress_scale, self.coherence_scale = make_rating_scales(self)
+
+        # Number of trials built ahead of the running one, during its ITI
+        self.prefetch_trials = stim_settings.get("prefetch_trials", 2)
+        self._pending_specs = deque()
+        self._prepared_trials = deque()
+
+        # Static parts of CS / CS_distress frames, pre-rendered per trial during the ITI
+        self.layers = None
+        if stim_settings.get("static_layers", True):
+            self.layers = LayerCache(self.win, max_layers=2 * (self.prefetch_trials + 1))
+
+        # Instruction and break screens, laid out and rendered once (see prepare_pages())
+        self.pages = None
+        if stim_settings.get("prerender_pages", True):
+            self.pages = PageCache(self.win)
+
+        # Decode every US sound once, before any trial is built
+        self.audio = AudioPool(self.win, os.path.join(STIM_DIR, "USsounds"))
+        self.audio.preload(pd.concat([self.practice_stimset["US_sound"], self.stimset["US_sound"]]))
+
 
     def show_text_screen(self, text, height=28, color="black", wait_keys=None, duration=None):
         """Show a full-screen text and wait for key press."""
 
-        msg = visual.TextStim(
-            win=self.win,
-            text=text,
-            height=height,
-            color=color,
-            font="Arial",
-            wrapWidth=0.9 * self.win.size[0],
-        )
+        if self.pages is not None:
+            msg = self.pages.page(text, height=height, color=color)
+        else:
+            msg = visual.TextStim(
+                win=self.win,
+                text=text,
+                height=height,
+                color=color,
+                font="Arial",
+                wrapWidth=0.9 * self.win.size[0],
+            )
 
         msg.draw()
         self.win.flip()
@@ -269,6 +264,31 @@ class ExtinctionSession(PylinkEyetrackerSession):
             # Wait for allowed keys
             event.waitKeys(keyList=list(wait_keys or ["space"]))
 
+        # keys of the text screen are not responses of the next trial
+        self.inputs.clear()
+
+    def session_pages(self):
+        """All text screens run() shows in this session, in order, with {block} filled in per block."""
+        texts = self.instructions[f"session_{self.sess}"]
+        pages = [text.format() for text in texts["before_session"]]
+        if self.sess == 1:
+            pages += [texts[key][0] for key in ("US_block", "US_prepare", "practice_start", "practice_end")]
+        else:
+            pages += [text.format() for text in texts["Start instructions"]]
+            pages.append(self.instructions["before_start"])
+        for block_idx in range(1, len(self.trials_by_block)):
+            pages.append(texts["between_blocks"][0].format(block=block_idx))
+            pages.append(texts["end of break"][0].format(block=block_idx))
+        return list(dict.fromkeys(pages))
+
+    def prepare_pages(self):
+        """Render all text screens of the session before the first one is shown."""
+        if self.pages is None:
+            return
+        pages = self.session_pages()
+        self.pages.max_layers = max(self.pages.max_layers, len(pages))
+        self.pages.prepare_pages(pages)
+
     # add instruction helper function
     def show_instruction_sequence(self, texts, **format_kwargs):
         for text in texts:
@@ -277,124 +297,38 @@ class ExtinctionSession(PylinkEyetrackerSession):
 
     def get_phases_for_trial(self, condition_label: str, is_last_block: bool):
         """Get phase names and durations for a trial, based off the session and condition."""
-        cfg = SESSION_CONFIG[self.sess]
-
-        base_phases = cfg[condition_label].copy()
-
-        if is_last_block and cfg.get("coherence_last_block", False):
-            base_phases.append("coherence")
-            base_phases.append("fixcross")
-
-        else:
-            base_phases.append("fixcross_long")
-
-        phase_names = []
-        phase_durations = []
-
-        for phase_key in base_phases:
-            draw_name, duration = PHASES[phase_key]
-
-            if isinstance(duration, tuple):
-                lo, hi = duration
-                duration = random.randint(lo,hi)
-
-            if self.test_mode:
-                duration *= 0.05  # speed up for testing
-
-            phase_names.append(draw_name)
-            phase_durations.append(duration)
-
-        return dict(names=phase_names, durations=phase_durations)
+        return phases_for_trial(self.sess, condition_label, is_last_block,
+                                rng=self.rng, test_mode=self.test_mode)
 
     def create_practice_trials(self):
-        """Create practice trials for session 1 only."""
-        practice_trials = []
-
-        # practice uses last-block phase structure
-        for trial_nr, stim_row in self.practice_stimset.iterrows():
-
-            params = stim_row.to_dict()
-            params["block"] = 0
-            params["practice"] = True
-
-            condition_value = int(stim_row["condition"])
-            condition_label = resolve_condition_label(self.sess, condition_value)
-
-            phases = self.get_phases_for_trial(
-                condition_label=condition_label,
-                is_last_block=True,
-            )
-
-            if trial_nr == 0:
-                print("Practice trial phases:", phases["names"])
-                print("Practice trial durations:", phases["durations"])
-                print(params)
-
-            trial = ExtinctionTrial(
-                session=self,
-                phase_names=phases["names"],
-                phase_durations=phases["durations"],
-                trial_nr=trial_nr,
-                parameters=params,
-            )
-
-            practice_trials.append(trial)
-
+        """Create practice trial specs for session 1 only."""
+        if self.schedule is not None:
+            return self.schedule["practice"]
+
+        practice_trials = practice_trial_specs(self.sess, self.practice_stimset,
+                                               rng=self.rng, test_mode=self.test_mode)
+        print("Practice trial phases:", practice_trials[0]["phase_names"])
+        print("Practice trial durations:", practice_trials[0]["phase_durations"])
+        print(practice_trials[0]["parameters"])
         return practice_trials
 
     def create_us_trials(self):
-        """Create a block of US trials, prior to session 1 only.
+        """Create a block of US trial specs, prior to session 1 only.
         
         Presents each unique US stimulus followed by a fixation cross.
         """
-        us_trials = []
-        
-        # Randomize order uniquely per block
-        randomized_stims = pseudorandomize_stimset(
-            self.stimset,
-            seed=None
-        )
+        if self.schedule is not None:
+            return self.schedule["us_habituation"]
 
-        # Get unique US stimuli from the stimset
-        unique_us = randomized_stims['US'].unique()
-        us_sounds = randomized_stims.groupby('US')['US_sound'].first()
-        
-        phase_names = ['US', 'fixcross']
-        
-        for trial_nr, us_stim in enumerate(unique_us):
-            us_sound = us_sounds[us_stim]
-            
-            # Set durations for habituation block
-            phase_durations = [4, random.randint(5,7)]  # US: 4s, fixcross: 5-7s
-            
-            if self.test_mode:
-                phase_durations = [d * 0.01 for d in phase_durations]
-            
-            # Create parameters dict
-            params = {
-                'US': us_stim,
-                'US_sound': us_sound,
-                'CS': '',  # Not used in habituation
-                'block': 0,  # habituation block
-                'episode_nr': trial_nr + 1,
-                'condition': 0,
-                'valence': 0,
-            }
-            
-            trial = ExtinctionTrial(
-                session=self,
-                phase_names=phase_names,
-                phase_durations=phase_durations,
-                trial_nr=trial_nr,
-                parameters=params,
-            )
-            
-            us_trials.append(trial)
-        
-        return us_trials
+        return us_trial_specs(self.stimset, rng=self.rng, test_mode=self.test_mode)
 
     def create_trials(self):
-        """Create practice and main trials for the session."""
+        """Create practice and main trial specs for the session.
+
+        Only lightweight specs are stored here; the ExtinctionTrial objects
+        (and their stimuli) are built just in time by run_trials(). With a
+        precompiled schedule the specs are replayed from it as-is.
+        """
 
         # practice trials
         self.practice_trials = []
@@ -403,48 +337,82 @@ class ExtinctionSession(PylinkEyetrackerSession):
             self.practice_trials = self.create_practice_trials()
             print(f"Created {len(self.practice_trials)} practice trials")
 
-
         # main trials, by block
-        self.trials_by_block = []
-
-        for block in range(self.blocks):
-
-            is_last_block = (block == self.blocks - 1)
-
-            # Randomize order uniquely per block
-            randomized_stimset = pseudorandomize_stimset(
-                self.stimset,
-                seed=None
-            )
-
-            block_trials = []
-
-            for trial_nr, stim_row in randomized_stimset.iterrows():
-
-                params = stim_row.to_dict()
-                params["block"] = block + 1
-
-                condition_value = int(stim_row["condition"])
-                condition_label = resolve_condition_label(self.sess, condition_value)
-
-                phases = self.get_phases_for_trial(
-                    condition_label=condition_label,
-                    is_last_block=is_last_block
-                )
+        if self.schedule is not None:
+            self.trials_by_block = self.schedule["blocks"]
+        else:
+            self.trials_by_block = block_trial_specs(self.sess, self.stimset, self.blocks,
+                                                     rng=self.rng, test_mode=self.test_mode,
+                                                     verbose=True)
 
-                trial = ExtinctionTrial(
-                    session=self,
-                    phase_names=phases["names"],
-                    phase_durations=phases["durations"],
-                    trial_nr=trial_nr,
-                    parameters=params
-                )
+    # =========================================================================
+    # Just-in-time trial construction
+    # =========================================================================
 
-                block_trials.append(trial)
+    def build_trial(self, spec):
+        """Build the trial (``trial_class``, and load its stimuli) for a trial spec.
 
-            self.trials_by_block.append(block_trials)
+        The next trials are prefetched during the last fixation phase (the ITI)
+        through the exptools2 load_next_during_phase hook.
+        """
+        phase_names = spec["phase_names"]
+        fix_phases = [i for i, name in enumerate(phase_names) if name == "fixcross"]
+
+        return self.trial_class(
+            session=self,
+            trial_nr=spec["trial_nr"],
+            phase_names=phase_names,
+            phase_durations=spec["phase_durations"],
+            parameters=spec["parameters"],
+            load_next_during_phase=fix_phases[-1] if fix_phases else None,
+        )
 
+    def create_trial(self, trial_nr=None):
+        """Build upcoming trials until ``prefetch_trials`` are ready.
 
+        Called by ExtinctionTrial.load_next_trial() during the ITI of the
+        running trial. ``trial_nr`` is accepted for compatibility with the
+        exptools2 hook but unused, since the queue is already in presentation
+        order.
+        """
+        while self._pending_specs and len(self._prepared_trials) < self.prefetch_trials:
+            trial = self.build_trial(self._pending_specs.popleft())
+            trial.prepare_layers()
+            self._prepared_trials.append(trial)
+        self.prefetch_images()
+
+    def prefetch_images(self):
+        """Queue the images of the next ``decode_ahead`` pending trials for background decoding."""
+        paths = []
+        for spec in list(self._pending_specs)[:self.decode_ahead]:
+            paths.extend(p for p in stimulus_paths(spec["parameters"]) if p is not None)
+        self.textures.prefetch(paths)
+
+    def run_trials(self, specs):
+        """Run a sequence of trial specs, building each trial just in time.
+
+        Finished trials are dropped straight away, so only the running trial
+        and the prefetched ones are held in memory.
+        """
+        self._pending_specs = deque(specs)
+        self._prepared_trials = deque()
+        self.prefetch_images()
+        self.scheduler.reset()
+
+        while self._pending_specs or self._prepared_trials:
+            if not self._prepared_trials:
+                # nothing prefetched (first trial, or the ITI was skipped)
+                trial = self.build_trial(self._pending_specs.popleft())
+                trial.prepare_layers()
+                self._prepared_trials.append(trial)
+
+            trial = self._prepared_trials.popleft()
+            trial.run()
+            del trial
+
+        # Close the last phase at its own offset, before any text screen flips
+        if self.frame_timer is not None:
+            self.frame_timer.flush()
 
     def run(self):
         """Run the experimental session."""
@@ -452,6 +420,9 @@ class ExtinctionSession(PylinkEyetrackerSession):
         # Create main trials
         self.create_trials()
 
+        # Lay out and render the instruction and break screens now, not while the participant waits
+        self.prepare_pages()
+
         # session instructions
         session_key = f"session_{self.sess}"
         self.show_instruction_sequence(
@@ -479,8 +450,7 @@ class ExtinctionSession(PylinkEyetrackerSession):
             self.start_experiment()
             
             us_trials = self.create_us_trials()
-            for trial in us_trials:
-                trial.run()
+            self.run_trials(us_trials)
 
         # practice trials for session 1 only
         if self.sess == 1:
@@ -488,8 +458,7 @@ class ExtinctionSession(PylinkEyetrackerSession):
                 self.instructions["session_1"]["practice_start"][0]
             )
 
-            for trial in self.practice_trials:
-                trial.run()
+            self.run_trials(self.practice_trials)
 
             # Pause after practice
             self.show_text_screen(
@@ -536,16 +505,20 @@ class ExtinctionSession(PylinkEyetrackerSession):
                 )
 
 
-            for trial in block_trials:
-                trial.run()
+            self.run_trials(block_trials)
 
         # End experiment (also stops eyetracking recording)
         self.close()
 
     def close(self):
+        self._save_outputs()
+
         # Close base - PylinkEyeTrackerSession will download the EDF file from the EyeLink Host PC and save it in the session output directory.
         super().close()
 
+        # The events log is written, the streamed copy is no longer needed
+        self._remove_partial_log()
+
         # Check for EDF file
         if isinstance(self, PylinkEyetrackerSession) and self.eyetracker_on:
             # Note that following filename is taken from PylinkEyetrackerSession::close() and will thus break if dependency is changed.
@@ -554,9 +527,44 @@ class ExtinctionSession(PylinkEyetrackerSession):
                 logging.warning(f"Expected EyeLink EDF file {edfFile} does not exist")
                 return
 
-            hdf5Filename = edfFile.with_suffix(".hdf5")
-            # Convert to HDF5
-            eyeOperator = hedfpy.HDFEyeOperator(str(hdf5Filename))
-            eyeOperator.add_edf_file(str(edfFile))
-            eyeOperator.edf_message_data_to_hdf()
-            eyeOperator.edf_gaze_data_to_hdf()
+            # Convert to HDF5, by default in a detached process so the session ends straight away
+            # (unfinished conversions are picked up by: python edf_convert.py ./logs)
+            convert = self.settings["eyetracker"].get("convert_edf", "background")
+            if not self.backends.get("edf_convert"):
+                convert = "off"  # hedfpy not installed on this machine
+            if convert == "background":
+                start_background(edfFile)
+                print(f"Converting {edfFile.name} to HDF5 in the background")
+            elif convert == "inline":
+                convert_edf(edfFile)
+
+    def key_source(self):
+        """Source of the session's key presses (keyboard queue on the session clock)."""
+        return KeyboardSource(self.clock)
+
+    def _save_outputs(self):
+        """Write the side logs (audio latency, markers, frame timing) and merge the event log into global_log."""
+        print("Texture cache:", self.textures.stats())
+        print("Image decoder:", self.decoder.stats())
+        self.decoder.shutdown()
+        self.audio.save(os.path.join(self.output_dir, f"{self.output_str}_audio_latency.tsv"))
+
+        if self.markers is not None:
+            self.markers.close()
+            self.markers.save(os.path.join(self.output_dir, f"{self.output_str}_markers.tsv"))
+
+        self.trajectories.save(os.path.join(self.output_dir, f"{self.output_str}_rating_trajectories.npz"))
+
+        if self.frame_timer is not None:
+            self.frame_timer.save(os.path.join(self.output_dir, f"{self.output_str}_frame_timing.tsv"))
+
+        # Convert the event log to the global_log schema, so exptools2 writes it as before
+        self.event_log.close()
+        self.global_log = self.event_log.merge_into(self.global_log)
+
+    def _remove_partial_log(self):
+        """Delete the streamed event log once the events log has been written."""
+        stream = self.event_log.stream
+        events_file = os.path.join(self.output_dir, f"{self.output_str}_events.tsv")
+        if stream is not None and os.path.exists(events_file) and os.path.exists(stream.path):
+            os.remove(stream.path)
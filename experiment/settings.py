@@ -0,0 +1,173 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Settings and instructions for the Episodic Extinction experiment.
+
+``expsettings.yml`` and ``instructions.yml`` are parsed and validated
+here, before any window exists; each file is parsed once per process
+(and again only when it changes on disk). All problems of a file are
+reported together, so a broken settings file fails at startup rather
+than halfway through a session.
+
+Usage (check both files before a session):
+    python settings.py [expsettings.yml] [--instructions instructions.yml]
+"""
+
+from design import SESSION_BLOCKS
+from functools import lru_cache
+import argparse
+import copy
+import yaml
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SETTINGS_FILE = os.path.join(HERE, "expsettings.yml")
+INSTRUCTIONS_FILE = os.path.join(HERE, "instructions.yml")
+
+# (section, key): allowed type(s); required keys have no default in the code
+REQUIRED_SETTINGS = {
+    ("test_settings", "test_mode_on"): bool,
+    ("test_settings", "eyetracker_on"): bool,
+    ("test_settings", "serial_markers_on"): bool,
+    ("test_settings", "parallel_markers_on"): bool,
+    ("mouse", "visible"): bool,
+}
+OPTIONAL_SETTINGS = {
+    ("test_settings", "loopback_markers_on"): bool,
+    ("markers", "pulse_width"): (int, float),
+    ("logging", "stream_events"): bool,
+    ("frame_timing", "log_on"): bool,
+    ("frame_timing", "buffer_size"): int,
+    ("stimuli", "texture_cache_mb"): (int, float),
+    ("stimuli", "prefetch_trials"): int,
+    ("stimuli", "decode_workers"): int,
+    ("stimuli", "decode_ahead"): int,
+    ("stimuli", "static_layers"): bool,
+    ("stimuli", "prerender_pages"): bool,
+    ("eyetracker", "convert_edf"): str,
+}
+CONVERT_EDF_OPTIONS = ("background", "inline", "off")
+
+
+class SettingsError(ValueError):
+    """A settings or instructions file is missing entries or has invalid values."""
+
+
+# =========================================================================
+# Loading
+# =========================================================================
+
+@lru_cache(maxsize=None)
+def _parse(path, mtime):
+    with open(path, "r") as f:
+        return yaml.safe_load(f) or {}
+
+
+def _load(path):
+    path = os.path.abspath(path)
+    # a copy, so callers can adjust their settings without touching the cache
+    return copy.deepcopy(_parse(path, os.stat(path).st_mtime_ns))
+
+
+def load_settings(path=SETTINGS_FILE):
+    """Parsed and validated experiment settings (``expsettings.yml``)."""
+    settings = _load(path)
+    validate_settings(settings, path)
+    return settings
+
+
+def load_instructions(path=INSTRUCTIONS_FILE, sessions=None):
+    """Parsed instructions (``instructions.yml``), validated for ``sessions`` (default all)."""
+    instructions = _load(path)
+    validate_instructions(instructions, sessions, path)
+    return instructions
+
+
+# =========================================================================
+# Validation
+# =========================================================================
+
+def _check_type(errors, name, value, types):
+    if isinstance(value, bool) and bool not in (types if isinstance(types, tuple) else (types,)):
+        errors.append(f"{name} should be a number, not {value!r}")
+    elif not isinstance(value, types):
+        expected = " or ".join(t.__name__ for t in (types if isinstance(types, tuple) else (types,)))
+        errors.append(f"{name} should be {expected}, not {value!r}")
+
+
+def validate_settings(settings, path="expsettings.yml"):
+    """Raise a SettingsError listing every missing or invalid setting."""
+    errors = []
+    for (section, key), types in {**REQUIRED_SETTINGS, **OPTIONAL_SETTINGS}.items():
+        values = settings.get(section)
+        if values is None or key not in values:
+            if (section, key) in REQUIRED_SETTINGS:
+                errors.append(f"{section}.{key} is missing")
+            continue
+        if not isinstance(values, dict):
+            errors.append(f"{section} should be a section, not {values!r}")
+            continue
+        _check_type(errors, f"{section}.{key}", values[key], types)
+
+    pulse_width = settings.get("markers", {}).get("pulse_width", 0.01)
+    if isinstance(pulse_width, (int, float)) and pulse_width <= 0:
+        errors.append(f"markers.pulse_width should be positive, not {pulse_width}")
+    convert = settings.get("eyetracker", {}).get("convert_edf", "background")
+    if convert not in CONVERT_EDF_OPTIONS:
+        errors.append(f"eyetracker.convert_edf should be one of {CONVERT_EDF_OPTIONS}, not {convert!r}")
+    size = settings.get("window", {}).get("size")
+    if size is not None and not (isinstance(size, list) and len(size) == 2):
+        errors.append(f"window.size should be [width, height], not {size!r}")
+
+    if errors:
+        raise SettingsError(f"Invalid settings in {path}:\n  " + "\n  ".join(errors))
+
+
+def required_instructions(sess):
+    """Instruction keys ExtinctionSession.run() uses in session ``sess``."""
+    keys = ["before_session"]
+    if sess == 1:
+        keys += ["US_block", "US_prepare", "practice_start", "practice_end"]
+    else:
+        keys += ["Start instructions"]
+    if SESSION_BLOCKS[sess] > 1:
+        keys += ["between_blocks", "end of break"]
+    return keys
+
+
+def validate_instructions(instructions, sessions=None, path="instructions.yml"):
+    """Raise a SettingsError listing every instruction text ``sessions`` need but lack."""
+    errors = []
+    sessions = SESSION_BLOCKS if sessions is None else sessions
+    if any(sess != 1 for sess in sessions) and not isinstance(instructions.get("before_start"), str):
+        errors.append("before_start is missing")
+
+    for sess in sessions:
+        texts = instructions.get(f"session_{sess}")
+        if not isinstance(texts, dict):
+            errors.append(f"session_{sess} is missing")
+            continue
+        for key in required_instructions(sess):
+            pages = texts.get(key)
+            if not pages or not isinstance(pages, list) or not all(isinstance(p, str) for p in pages):
+                errors.append(f"session_{sess}.{key} should be a list of texts")
+
+    if errors:
+        raise SettingsError(f"Invalid instructions in {path}:\n  " + "\n  ".join(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate the settings and instructions files.")
+    parser.add_argument("settings", nargs="?", default=SETTINGS_FILE)
+    parser.add_argument("--instructions", default=INSTRUCTIONS_FILE)
+    args = parser.parse_args()
+
+    load_settings(args.settings)
+    load_instructions(args.instructions)
+    print(f"{args.settings} and {args.instructions} are valid")
+
+
+if __name__ == '__main__':
+    main()
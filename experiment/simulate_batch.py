@@ -0,0 +1,113 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Batch simulation of many virtual participants for the Episodic Extinction experiment.
+
+Every subject/version/day is one headless session (simulation.py), run in
+a process pool. Sessions are independent, so throughput scales with the
+number of cores. Each session writes its own logs, as a real one would;
+all events are also combined into one Parquet dataset with the events-log
+columns plus ``subject``, ``version`` and ``sess``.
+
+Usage:
+    python simulate_batch.py --subjects 1-50 --pad 3 [--versions 1-10] [--days 1 2 3]
+                             [--distress 4 2] [--coherence 6 2] [--negative-effect 2]
+                             [--ext-effect -1] [--subject-sd 1] [--p-miss 0.02]
+                             [--out ./logs/simulation] [--workers 8]
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from simulation import RandomResponder, simulate_session
+from schedule import schedule_seed, parse_list
+import numpy as np
+import pandas as pd
+import argparse
+import time
+import os
+
+
+def participant_offset(subject, sd):
+    """Random intercept of a subject: the same on every day and version."""
+    if not sd:
+        return 0.0
+    return sd * np.random.default_rng(schedule_seed(subject, "participant", 0)).standard_normal()
+
+
+def make_responder(subject, version, sess, model):
+    """RandomResponder of one subject/day, seeded by the subject/version/day."""
+    effects = {("valence", 1): model["negative_effect"],
+               ("condition_label", "EXT"): model["ext_effect"]}
+    rng = np.random.default_rng([schedule_seed(subject, version, sess), 1])
+    return RandomResponder(distress=model["distress"], coherence=model["coherence"],
+                           effects={k: v for k, v in effects.items() if v},
+                           offset=participant_offset(subject, model["subject_sd"]),
+                           p_miss=model["p_miss"], rng=rng)
+
+
+def _simulate_job(job):
+    subject, version, sess, out_dir, model = job
+    responder = make_responder(subject, version, sess, model)
+    log = simulate_session(subject, version, sess, out_dir, responder=responder, quiet=True)
+
+    log = log.reset_index()
+    log.insert(0, "sess", sess)
+    log.insert(0, "version", str(version))
+    log.insert(0, "subject", str(subject))
+    return log
+
+
+def write_dataset(logs, path):
+    """Concatenate session logs and write them to one Parquet file."""
+    data = pd.concat(logs, ignore_index=True)
+    # mixed columns (e.g. response: keys and ratings) are stored as text
+    for col in data.columns[data.dtypes == object]:
+        data[col] = data[col].astype("string")
+    for col in ("subject", "version", "event_type"):
+        data[col] = data[col].astype("category")
+    data.to_parquet(path, compression="zstd", index=False)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many participants in parallel.")
+    parser.add_argument("--subjects", nargs="+", required=True, help="e.g. 1-50 or 001 002")
+    parser.add_argument("--pad", type=int, default=0, help="zero-pad subject numbers to this width")
+    parser.add_argument("--versions", nargs="+", default=["1-10"])
+    parser.add_argument("--days", nargs="+", type=int, default=[1, 2, 3])
+    parser.add_argument("--distress", nargs=2, type=float, default=[4, 2], metavar=("MEAN", "SD"))
+    parser.add_argument("--coherence", nargs=2, type=float, default=[6, 2], metavar=("MEAN", "SD"))
+    parser.add_argument("--negative-effect", type=float, default=2.0, help="distress shift on negative trials")
+    parser.add_argument("--ext-effect", type=float, default=-1.0, help="distress shift on EXT trials")
+    parser.add_argument("--subject-sd", type=float, default=1.0, help="SD of participant random intercepts")
+    parser.add_argument("--p-miss", type=float, default=0.0, help="probability of not rating")
+    parser.add_argument("--out", default=os.path.join(".", "logs", "simulation"))
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    args = parser.parse_args()
+
+    model = dict(distress=tuple(args.distress), coherence=tuple(args.coherence),
+                 negative_effect=args.negative_effect, ext_effect=args.ext_effect,
+                 subject_sd=args.subject_sd, p_miss=args.p_miss)
+
+    jobs = [(subject, version, sess, args.out, model)
+            for subject in parse_list(args.subjects, args.pad)
+            for version in parse_list(args.versions)
+            for sess in args.days]
+
+    wall_start = time.perf_counter()
+    logs = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for i, log in enumerate(pool.map(_simulate_job, jobs), 1):
+            logs.append(log)
+            if i % 50 == 0 or i == len(jobs):
+                print(f"{i}/{len(jobs)} sessions ({time.perf_counter() - wall_start:.0f} s)")
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, "simulated_events.parquet")
+    data = write_dataset(logs, path)
+    print(f"Wrote {len(data)} events of {len(jobs)} sessions to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,490 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Headless simulation of the Episodic Extinction experiment.
+
+Runs ExtinctionSession.run() against a virtual clock: there is no window
+(every flip advances the clock by one refresh interval), no sound device
+and no keyboard; ratings are entered by a scripted or random responder.
+A session takes seconds instead of an hour and writes the same events log
+and side logs as a real session.
+
+Usage:
+    python simulation.py --subject sim01 --version 1 [--days 1 2 3]
+                         [--out ./logs/simulation] [--seed 0] [--quiet]
+"""
+
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from session import ExtinctionSession
+from schedule import schedule_seed
+from design import resolve_condition_label
+from event_log import finalise_log
+from inputs import SyntheticKeySource
+from settings import load_settings
+import numpy as np
+import pandas as pd
+import argparse
+import time
+import os
+
+import trial as _trial_module
+import session as _session_module
+import stimuli as _stimuli_module
+import layers as _layers_module
+
+SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "expsettings.yml")
+
+
+# =========================================================================
+# Virtual clock and window
+# =========================================================================
+
+class VirtualClock:
+    """Stand-in for psychopy.core.Clock, advanced explicitly instead of by the wall clock."""
+
+    def __init__(self):
+        self._now = 0.0      # time since the clock was created
+        self._origin = 0.0   # _now at the last reset()
+
+    def getTime(self):
+        return self._now - self._origin
+
+    def reset(self, newT=0.0):
+        self._origin = self._now - newT
+
+    def advance(self, dt):
+        """Move the clock forward by ``dt`` seconds."""
+        self._now += dt
+
+    def absolute(self):
+        """Time since creation, unaffected by reset() (stands in for the PTB clock)."""
+        return self._now
+
+
+class HeadlessWindow:
+    """
+    Minimal stand-in for psychopy.visual.Window.
+
+    ``flip()`` advances the virtual clock by one refresh interval (two with
+    probability ``drop_rate``, to simulate dropped frames) and then runs the
+    callbacks registered with ``callOnFlip()``, as PsychoPy does.
+
+    Parameters
+    ----------
+    clock      : VirtualClock
+    size       : window size in pixels
+    frame_rate : refresh rate in Hz (default 60)
+    drop_rate  : probability that a flip misses one refresh (default 0)
+    rng        : numpy Generator for dropped frames
+    """
+
+    def __init__(self, clock, size=(1920, 1080), frame_rate=60.0, drop_rate=0.0, rng=None):
+        self.clock = clock
+        self.size = np.array(size)
+        self.frame_rate = frame_rate
+        self.frame_dur = 1.0 / frame_rate
+        self.drop_rate = drop_rate
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        self.units = "pix"
+        self.mouseVisible = False
+        self.recordFrameIntervals = False
+        self.frameIntervals = []
+        self.lastFrameT = None
+        self.nDroppedFrames = 0
+        self._on_flip = []
+
+    def callOnFlip(self, function, *args, **kwargs):
+        self._on_flip.append((function, args, kwargs))
+
+    def flip(self, clearBuffer=True):
+        n_frames = 1
+        if self.drop_rate and self.rng.random() < self.drop_rate:
+            n_frames = 2
+            self.nDroppedFrames += 1
+        self.clock.advance(n_frames * self.frame_dur)
+        self.lastFrameT = self.clock.absolute()
+        if self.recordFrameIntervals:
+            self.frameIntervals.append(n_frames * self.frame_dur)
+
+        callbacks, self._on_flip = self._on_flip, []
+        for function, args, kwargs in callbacks:
+            function(*args, **kwargs)
+        return self.lastFrameT
+
+    def getFutureFlipTime(self, targetTime=0, clock=None):
+        """Time of the next flip: on the PTB (absolute) timeline if ``clock='ptb'``."""
+        now = self.clock.absolute() if clock == "ptb" else self.clock.getTime()
+        return now + max(self.frame_dur, targetTime)
+
+    def getActualFrameRate(self, *args, **kwargs):
+        return self.frame_rate
+
+    def close(self):
+        self._on_flip = []
+
+
+# =========================================================================
+# Null stimuli and sound
+# =========================================================================
+
+class NullStim:
+    """Accepts any stimulus arguments and attribute changes; draws nothing."""
+
+    def __init__(self, *args, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def draw(self, win=None):
+        pass
+
+    def setAutoDraw(self, value):
+        pass
+
+
+class NullSound:
+    """Stand-in for psychopy.sound.Sound; reports the scheduled start as its onset."""
+
+    def __init__(self, value=None, clock=None, latency=0.0, **kwargs):
+        self.value = value
+        self._clock = clock
+        self.latency = latency
+        self.track = type("Track", (), {})()
+        self.track.status = {"StartTime": 0}
+
+    def play(self, when=None, **kwargs):
+        start = self._clock.absolute() if when is None else when
+        self.track.status = {"StartTime": start + self.latency}
+
+    def stop(self):
+        pass
+
+
+class _NullModule:
+    """Module stand-in: every attribute is a null stimulus (or sound) class."""
+
+    def __init__(self, factory):
+        self._factory = factory
+
+    def __getattr__(self, name):
+        return self._factory
+
+
+@contextmanager
+def headless(clock, audio_latency=0.0):
+    """
+    Swap PsychoPy's visual and sound modules (and the PTB clock) used by the
+    experiment modules for null objects on ``clock``; restored on exit.
+    """
+    def make_sound(*args, **kwargs):
+        return NullSound(*args, clock=clock, latency=audio_latency, **kwargs)
+
+    patches = [
+        (_trial_module, "visual", _NullModule(NullStim)),
+        (_session_module, "visual", _NullModule(NullStim)),
+        (_layers_module, "visual", _NullModule(NullStim)),
+        (_stimuli_module, "visual", _NullModule(NullStim)),
+        (_stimuli_module, "sound", _NullModule(make_sound)),
+        (_stimuli_module, "getTime", clock.absolute),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, value in patches:
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+
+# =========================================================================
+# Responders
+# =========================================================================
+
+class Responder:
+    """
+    Simulated participant entering ratings with the arrow keys.
+
+    At the start of every rating phase the responder picks a rating
+    (``rating()``, None for no response; mid-scale unless a subclass
+    overrides it) and plans the key presses that
+    move the KeyboardScale marker there: one press to activate the scale at
+    its start value, then one press per step. Presses come ``rt`` seconds
+    after phase onset (log-normally jittered) and ``ipi`` seconds apart;
+    presses falling after the end of the phase are lost, as they would be.
+
+    Parameters
+    ----------
+    rng : numpy Generator
+    rt  : median time from phase onset to the first press, in seconds
+    ipi : interval between subsequent presses, in seconds
+    """
+
+    # rating phase -> name of the session scale
+    rating_phases = {"CS_distress": "distress", "coherence": "coherence"}
+
+    def __init__(self, rng=None, rt=1.2, ipi=0.15):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.rt = rt
+        self.ipi = ipi
+        self._phase = None     # (trial_nr, phase) the current plan belongs to
+        self._presses = []     # planned (time, key), in time order
+
+    def rating(self, trial, scale_name, scale):
+        """Rating to enter on ``scale`` (None: do not respond); the middle of the scale."""
+        return (scale.min_val + scale.max_val) / 2
+
+    def _plan(self, trial, t):
+        scale_name = self.rating_phases.get(trial.phase_name)
+        if scale_name is None:
+            return []
+        scale = getattr(trial, f"{scale_name}_scale")
+        value = self.rating(trial, scale_name, scale)
+        if value is None:
+            return []
+
+        value = int(np.clip(value, scale.min_val, scale.max_val))
+        start = scale._start_val
+        key = scale.right_key if value >= start else scale.left_key
+        n_presses = 1 + int(round(abs(value - start) / scale.step))
+
+        first = t + self.rt * np.exp(0.3 * self.rng.standard_normal())
+        return [(first + i * self.ipi, key) for i in range(n_presses)]
+
+    def poll(self, trial, t):
+        """Key presses up to time ``t`` of the running phase, as (key, time) tuples."""
+        phase = (trial.trial_nr, trial.phase)
+        if phase != self._phase:
+            self._phase = phase
+            self._presses = self._plan(trial, t)
+
+        events = []
+        while self._presses and self._presses[0][0] <= t:
+            t_press, key = self._presses.pop(0)
+            events.append((key, t_press))
+        return events
+
+
+class RandomResponder(Responder):
+    """
+    Ratings drawn from rounded normal distributions, per scale.
+
+    Distress means can differ between trials: ``effects`` maps
+    ``(column, value)`` to a shift of the distress mean on trials whose
+    parameter ``column`` has that value; the column ``"condition_label"``
+    matches the label of ``resolve_condition_label()`` (CC, EXT, ...).
+    ``offset`` shifts both scales, e.g. a participant's random intercept.
+
+    Parameters
+    ----------
+    distress  : (mean, sd) of distress ratings (default (5, 2))
+    coherence : (mean, sd) of coherence ratings (default (6, 2))
+    effects   : {(column, value): shift} of the distress mean (default none)
+    offset    : shift of all ratings (default 0)
+    p_miss    : probability of not responding in a rating phase
+    """
+
+    def __init__(self, distress=(5, 2), coherence=(6, 2), effects=None, offset=0.0,
+                 p_miss=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.distributions = dict(distress=distress, coherence=coherence)
+        self.effects = dict(effects or {})
+        self.offset = offset
+        self.p_miss = p_miss
+
+    def _distress_shift(self, trial):
+        shift = 0.0
+        for (column, value), effect in self.effects.items():
+            if column == "condition_label":
+                actual = resolve_condition_label(trial.session.sess, trial.parameters.get("condition"))
+            else:
+                actual = trial.parameters.get(column)
+            if actual == value:
+                shift += effect
+        return shift
+
+    def rating(self, trial, scale_name, scale):
+        if self.p_miss and self.rng.random() < self.p_miss:
+            return None
+        mean, sd = self.distributions[scale_name]
+        mean += self.offset
+        if scale_name == "distress":
+            mean += self._distress_shift(trial)
+        return round(mean + sd * self.rng.standard_normal())
+
+
+class ScriptedResponder(Responder):
+    """
+    Ratings from a script: a callable ``(trial, scale_name) -> rating`` or a
+    mapping ``{(trial_nr, scale_name): rating}`` (missing entries: no response).
+    """
+
+    def __init__(self, ratings, **kwargs):
+        super().__init__(**kwargs)
+        self.ratings = ratings
+
+    def rating(self, trial, scale_name, scale):
+        if callable(self.ratings):
+            return self.ratings(trial, scale_name)
+        return self.ratings.get((trial.trial_nr, scale_name))
+
+
+# =========================================================================
+# Simulated session
+# =========================================================================
+
+class SimulatedSession(ExtinctionSession):
+    """
+    ExtinctionSession on a virtual clock and headless window.
+
+    The exptools2 session is not initialised (no window, tracker, or
+    ports); the attributes the experiment uses are set here instead and the
+    experiment setup is shared with ExtinctionSession. Must be created and
+    run inside ``headless(session_clock)``; see ``simulate_session()``.
+
+    Parameters
+    ----------
+    output_str, output_dir, settings_file, sess, version, schedule_file :
+        as for ExtinctionSession
+    clock        : VirtualClock (default: a new one)
+    responder    : Responder entering the ratings (default: RandomResponder)
+    rng          : numpy Generator for trial orders and durations
+    frame_rate   : simulated refresh rate in Hz (default 60)
+    drop_rate    : probability of a dropped frame per flip (default 0)
+    window_size  : simulated window size, if not given in the settings
+    reading_time : seconds spent on every self-paced instruction screen
+    test_mode    : shortened durations, as in a real test-mode session
+    """
+
+    def __init__(self, output_str, output_dir=None, settings_file="expsettings.yml",
+                 sess=None, version=None, schedule_file=None, clock=None,
+                 responder=None, rng=None, frame_rate=60.0, drop_rate=0.0,
+                 window_size=(1920, 1080), reading_time=2.0, test_mode=False):
+
+        self.settings = load_settings(settings_file)
+
+        # no hardware in a simulation
+        self.settings["test_settings"].update(
+            test_mode_on=test_mode, eyetracker_on=False,
+            serial_markers_on=False, parallel_markers_on=False)
+        self.settings["window"].setdefault("size", list(window_size))
+
+        self.output_str = output_str
+        self.output_dir = output_dir or os.path.join(os.getcwd(), "logs", "simulation")
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        rng = rng if rng is not None else np.random.default_rng()
+        self.clock = clock or VirtualClock()
+        self.win = HeadlessWindow(self.clock, self.settings["window"]["size"],
+                                  frame_rate=frame_rate, drop_rate=drop_rate, rng=rng.spawn(1)[0])
+        self.actual_framerate = frame_rate
+        self.responder = responder or RandomResponder(rng=rng.spawn(1)[0])
+        self.reading_time = reading_time
+
+        # exptools2 session state used by the experiment
+        self.eyetracker_on = False
+        self.nr_frames = 0
+        self.exp_start = None
+        self.exp_stop = None
+        self.closed = False
+        self.global_log = pd.DataFrame(columns=["trial_nr", "onset", "event_type",
+                                                "phase", "response", "nr_frames"])
+
+        self._init_experiment(sess, version, schedule_file)
+        self.rng = rng
+
+        # nothing to decode for null stimuli
+        self.textures.decoder = None
+
+    # ── exptools2 / PsychoPy stand-ins ─────────────────────────────────
+
+    def key_source(self):
+        """Key presses of the responder instead of the keyboard."""
+        return SyntheticKeySource(feed=self.responder.poll)
+
+    def show_text_screen(self, text, height=28, color="black", wait_keys=None, duration=None):
+        """Show a text screen: wait ``duration``, or ``reading_time`` for self-paced screens."""
+        self.win.flip()
+        self.clock.advance(self.reading_time if duration is None else duration)
+
+    def start_experiment(self, *args, **kwargs):
+        self.win.flip()
+        self.exp_start = self.clock.getTime()
+        self.clock.reset()
+
+    def close(self):
+        """Write the events log as exptools2 does, plus the side logs."""
+        if self.closed:
+            return
+        self.win.flip()
+        self.exp_stop = self.clock.getTime()
+
+        self._save_outputs()
+        self.global_log = finalise_log(self.global_log, self.exp_start or 0.0,
+                                       self.exp_stop, self.nr_frames)
+        self.global_log.to_csv(os.path.join(self.output_dir, f"{self.output_str}_events.tsv"),
+                               sep="\t", index=True)
+        self._remove_partial_log()
+        self.win.close()
+        self.closed = True
+
+
+# =========================================================================
+# Running simulations
+# =========================================================================
+
+def simulate_session(subject, version, sess, out_dir, seed=None, responder=None,
+                     quiet=False, settings_file=SETTINGS_FILE, **kwargs):
+    """
+    Simulate one session and write its logs to ``out_dir/sub-<subject>/<output_str>``.
+
+    Trial orders use ``seed`` (default: the subject/version/day seed of
+    schedule.py), so a simulation is reproducible. Extra keyword arguments
+    go to SimulatedSession.
+
+    Returns
+    -------
+    The session's global_log (DataFrame)
+    """
+    output_str = f"sub-{subject}_ses-{sess}_v-{version}"
+    output_dir = os.path.join(out_dir, f"sub-{subject}", output_str)
+    rng = np.random.default_rng(schedule_seed(subject, version, sess) if seed is None else seed)
+    if responder is None:
+        responder = RandomResponder(rng=rng.spawn(1)[0])
+
+    clock = VirtualClock()
+    with headless(clock), open(os.devnull, "w") as devnull, \
+            redirect_stdout(devnull) if quiet else nullcontext():
+        session = SimulatedSession(output_str, output_dir=output_dir, settings_file=settings_file,
+                                   sess=int(sess), version=str(version), clock=clock,
+                                   responder=responder, rng=rng, **kwargs)
+        session.run()
+    return session.global_log
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless simulated sessions.")
+    parser.add_argument("--subject", default="sim01")
+    parser.add_argument("--version", default="1")
+    parser.add_argument("--days", nargs="+", type=int, default=[1, 2, 3])
+    parser.add_argument("--out", default=os.path.join(".", "logs", "simulation"))
+    parser.add_argument("--seed", type=int, default=None, help="default: per subject/version/day")
+    parser.add_argument("--frame-rate", type=float, default=60.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="probability of a dropped frame per flip")
+    parser.add_argument("--test-mode", action="store_true", help="shortened durations, as test_mode_on")
+    parser.add_argument("--quiet", action="store_true", help="suppress per-trial console output")
+    args = parser.parse_args()
+
+    for sess in args.days:
+        wall_start = time.perf_counter()
+        log = simulate_session(args.subject, args.version, sess, args.out, seed=args.seed,
+                               quiet=args.quiet, frame_rate=args.frame_rate,
+                               drop_rate=args.drop_rate, test_mode=args.test_mode)
+        simulated = log["onset"].max() / 60
+        print(f"Day {sess}: {len(log)} events, {simulated:.1f} min simulated "
+              f"in {time.perf_counter() - wall_start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Shared stimulus resources for the Episodic Extinction experiment.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from psychopy import visual, sound, logging
+from psychopy.core import getTime
+import numpy as np
+import threading
+import time
+import csv
+import os
+
+# Size and texture resolution used for every CS/US image in ExtinctionTrial
+IMAGE_SIZE = (800, 800)
+IMAGE_TEX_RES = 512
+
+
+def _next_pow2(n):
+    """Smallest power of two >= n (PsychoPy pads textures to this size)."""
+    p = 1
+    while p < n:
+        p *= 2
+    return p
+
+
+class ImageDecoder:
+    """
+    Worker thread pool that reads and decodes stimulus images ahead of time.
+
+    Decoding produces float32 RGB arrays in PsychoPy's -1..1 range (bottom
+    row first), so the render thread only has to upload them to the GPU.
+
+    Parameters
+    ----------
+    n_workers : number of decoding threads (default 2)
+    """
+
+    def __init__(self, n_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=n_workers,
+                                            thread_name_prefix="ImageDecoder")
+        self._futures = OrderedDict()   # abs path -> Future, in submission order
+        self._lock = threading.Lock()
+        self.decode_times = {}          # abs path -> seconds spent decoding
+
+    def _decode(self, path):
+        from PIL import Image
+        t0 = time.perf_counter()
+        with Image.open(path) as img:
+            pixels = np.asarray(img.convert("RGB"), dtype=np.float32)
+        pixels = np.flipud(pixels) / 127.5 - 1.0
+        self.decode_times[path] = time.perf_counter() - t0
+        return pixels
+
+    def submit(self, path):
+        """Queue ``path`` for decoding (no-op if it is already queued)."""
+        path = os.path.abspath(path)
+        with self._lock:
+            if path not in self._futures:
+                self._futures[path] = self._executor.submit(self._decode, path)
+
+    def __contains__(self, path):
+        return os.path.abspath(path) in self._futures
+
+    @property
+    def queue_depth(self):
+        """Number of submitted images that have not finished decoding."""
+        with self._lock:
+            return sum(not f.done() for f in self._futures.values())
+
+    def completed(self):
+        """Paths whose decoded pixels are ready to be uploaded."""
+        with self._lock:
+            return [p for p, f in self._futures.items() if f.done()]
+
+    def pop(self, path):
+        """Return the decoded pixels of ``path``, waiting for the worker if needed."""
+        with self._lock:
+            future = self._futures.pop(os.path.abspath(path))
+        return future.result()
+
+    def stats(self):
+        """Queue depth and decode times, for monitoring."""
+        times = list(self.decode_times.values())
+        return dict(
+            queue_depth=self.queue_depth,
+            n_decoded=len(times),
+            mean_decode_s=float(np.mean(times)) if times else float("nan"),
+            max_decode_s=float(np.max(times)) if times else float("nan"),
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class TextureCache:
+    """
+    Session-level cache of CS/US ImageStims, keyed by file path and resize
+    parameters.
+
+    Every unique image is decoded and uploaded to the GPU once; trials that
+    show the same picture share one ImageStim. When the estimated texture
+    memory exceeds ``max_bytes`` the least recently used images are evicted
+    (they are reloaded on the next request).
+
+    With a ``decoder``, images passed to ``prefetch()`` are decoded on worker
+    threads and ``upload_ready()`` turns them into ImageStims a few at a time,
+    so that only the GPU upload happens on the render thread.
+
+    Parameters
+    ----------
+    win       : psychopy.visual.Window
+    max_bytes : memory budget for all cached textures (default 512 MB)
+    size      : default stimulus size in pixels
+    tex_res   : default texture resolution
+    decoder   : optional ImageDecoder for background decoding
+    """
+
+    def __init__(self, win, max_bytes=512 * 1024 ** 2,
+                 size=IMAGE_SIZE, tex_res=IMAGE_TEX_RES, interpolate=True,
+                 decoder=None):
+        self.win = win
+        self.decoder = decoder
+        self.max_bytes = max_bytes
+        self.size = tuple(size)
+        self.tex_res = tex_res
+        self.interpolate = interpolate
+
+        self._stims = OrderedDict()   # key -> (ImageStim, n_bytes), oldest first
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ── Helpers ───────────────────────────────────────────────────────
+
+    def key(self, path, size=None, tex_res=None):
+        """Cache key for an image: absolute path plus resize parameters."""
+        size = self.size if size is None else tuple(size)
+        tex_res = self.tex_res if tex_res is None else tex_res
+        return (os.path.abspath(path), size, tex_res)
+
+    def _estimate_bytes(self, path, tex_res, pixels=None):
+        """Estimate the RGBA texture size of an image, from its header only."""
+        if pixels is not None:
+            h, w = pixels.shape[:2]
+            return _next_pow2(w) * _next_pow2(h) * 4
+        try:
+            from PIL import Image
+            with Image.open(path) as img:
+                w, h = img.size
+            return _next_pow2(w) * _next_pow2(h) * 4
+        except Exception:
+            return tex_res * tex_res * 4
+
+    def _evict(self):
+        """Drop least recently used textures until we are within budget."""
+        # always keep the most recent entry, even if it alone exceeds the budget
+        while self.n_bytes > self.max_bytes and len(self._stims) > 1:
+            key, (stim, n_bytes) = self._stims.popitem(last=False)
+            self.n_bytes -= n_bytes
+            self.evictions += 1
+            logging.info(f"TextureCache: evicted {os.path.basename(key[0])}")
+
+    # ── Public API ────────────────────────────────────────────────────
+
+    def get(self, path, size=None, tex_res=None):
+        """Return the shared ImageStim for ``path``, loading it on a miss."""
+        key = self.key(path, size, tex_res)
+
+        entry = self._stims.get(key)
+        if entry is not None:
+            self._stims.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        return self._load(key, self._decoded_pixels(path))
+
+    def _decoded_pixels(self, path):
+        """Pixels from the background decoder, or None to let PsychoPy read the file."""
+        if self.decoder is None or path not in self.decoder:
+            return None
+        try:
+            return self.decoder.pop(path)
+        except Exception as e:
+            logging.warning(f"TextureCache: background decoding of {path} failed ({e})")
+            return None
+
+    def _load(self, key, pixels=None):
+        """Create (and upload) the ImageStim for ``key``."""
+        path, size, tex_res = key
+        stim = visual.ImageStim(
+            self.win,
+            image=path if pixels is None else pixels,
+            size=size,
+            texRes=tex_res,
+            interpolate=self.interpolate
+        )
+        n_bytes = self._estimate_bytes(path, tex_res, pixels)
+        self._stims[key] = (stim, n_bytes)
+        self.n_bytes += n_bytes
+        self._evict()
+        return stim
+
+    def preload(self, paths):
+        """Load every unique, uncached path in ``paths`` (e.g. all CS/US of a stimset)."""
+        for path in dict.fromkeys(paths):
+            if path not in self:
+                self.get(path)
+
+    def prefetch(self, paths):
+        """Queue uncached ``paths`` for background decoding (loads them if no decoder)."""
+        if self.decoder is None:
+            self.preload(paths)
+            return
+        for path in dict.fromkeys(paths):
+            if path not in self:
+                self.decoder.submit(path)
+
+    def upload_ready(self, max_uploads=1):
+        """Upload up to ``max_uploads`` decoded images; call from cheap frames."""
+        if self.decoder is None:
+            return 0
+        n = 0
+        for path in self.decoder.completed()[:max_uploads]:
+            pixels = self._decoded_pixels(path)
+            key = self.key(path)
+            if pixels is not None and key not in self._stims:
+                self._load(key, pixels)
+                n += 1
+        return n
+
+    def clear(self):
+        """Release all cached textures."""
+        self._stims.clear()
+        self.n_bytes = 0
+
+    def __len__(self):
+        return len(self._stims)
+
+    def __contains__(self, path):
+        return self.key(path) in self._stims
+
+    def stats(self):
+        """Summary of cache usage, for printing at the end of a session."""
+        return dict(
+            n_stims=len(self._stims),
+            n_bytes=self.n_bytes,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+
+class AudioPool:
+    """
+    Session-level pool of preloaded US sounds.
+
+    Each unique sound file is decoded once into a resident ``sound.Sound``
+    and the same handle is handed to every trial that uses it. ``play()``
+    schedules playback on the next flip (when the backend supports it) and
+    records, per play, the latency between that flip and the audio onset
+    reported by the backend.
+
+    All times are on the PTB clock (``psychopy.core.getTime`` when
+    psychtoolbox is installed), the clock the backend reports onsets on:
+    ``t_target`` is the flip time playback was scheduled for, ``t_flip``
+    is stamped by a callOnFlip callback. ``latency`` is the onset minus
+    ``t_target``, or minus ``t_flip`` when the backend cannot schedule.
+
+    Parameters
+    ----------
+    win       : psychopy.visual.Window
+    sound_dir : directory containing the .wav files
+    """
+
+    columns = ["trial_nr", "sound", "t_call", "t_target", "t_flip", "t_onset", "latency"]
+
+    def __init__(self, win, sound_dir):
+        self.win = win
+        self.sound_dir = sound_dir
+        self._sounds = {}
+        self.plays = []       # one dict per play(), see ``columns``
+        self._pending = []    # plays whose onset has not been resolved yet
+
+    def get(self, name):
+        """Return the shared Sound for ``name``, decoding it on first use."""
+        snd = self._sounds.get(name)
+        if snd is None:
+            snd = sound.Sound(os.path.join(self.sound_dir, name))
+            self._sounds[name] = snd
+        return snd
+
+    def preload(self, names):
+        """Decode every unique sound in ``names`` (e.g. all US_sound values)."""
+        for name in dict.fromkeys(names):
+            self.get(name)
+
+    def play(self, name, trial_nr=None):
+        """Play ``name`` locked to the next flip and log its timing."""
+        snd = self.get(name)
+        record = dict(trial_nr=trial_nr, sound=name, t_call=getTime(), t_target=float("nan"),
+                      t_flip=float("nan"), t_onset=float("nan"), latency=float("nan"))
+
+        try:
+            # PTB backend: start exactly at the upcoming flip
+            when = self.win.getFutureFlipTime(clock="ptb")
+            snd.play(when=when)
+            record["t_target"] = when
+        except (TypeError, AttributeError):
+            snd.play()
+
+        self.win.callOnFlip(self._stamp_flip, record)
+        self.plays.append(record)
+        self._pending.append((snd, record))
+
+    @staticmethod
+    def _stamp_flip(record):
+        # not win.lastFrameT: that is on PsychoPy's logging clock, not the PTB clock
+        record["t_flip"] = getTime()
+
+    @staticmethod
+    def _onset_time(snd):
+        """Audio onset reported by the backend, NaN if it reports none."""
+        try:
+            onset = snd.track.status["StartTime"]
+            if onset > 0:
+                return onset
+        except (AttributeError, KeyError, TypeError):
+            pass
+        return float("nan")
+
+    def resolve(self):
+        """
+        Fill in onset and latency of plays that have started since the last
+        call; both stay NaN when the backend reports no onset (t_call is
+        when play() was called, not a measurement of the onset).
+        """
+        for snd, record in self._pending:
+            record["t_onset"] = self._onset_time(snd)
+            reference = record["t_target"]
+            if reference != reference:  # NaN: played without a scheduled flip
+                reference = record["t_flip"]
+            record["latency"] = record["t_onset"] - reference
+        self._pending = []
+
+    def save(self, path):
+        """Write one row per play to a tab-separated file."""
+        self.resolve()
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.columns, delimiter="\t")
+            writer.writeheader()
+            writer.writerows(self.plays)
@@ -0,0 +1,160 @@
+"""
+Created on Sun Jan 4th 12:00:00 2026
+
+@author: Ralph Wientjens
+
+Frame timing instrumentation for the Episodic Extinction experiment.
+"""
+
+import numpy as np
+import csv
+
+
+class FrameScheduler:
+    """
+    Frame-locked phase scheduling on absolute session time.
+
+    Phase durations are converted to whole frames when a trial is created
+    (``plan()``). While running, the end of every phase is expressed as a
+    frame count since the anchor, i.e. the first flip of the current trial
+    sequence (a block), so rounding errors and per-phase overshoot do not
+    accumulate across trials: a late flip shortens the next phase instead of
+    delaying the rest of the block.
+
+    Parameters
+    ----------
+    frame_dur : measured refresh interval in seconds
+    """
+
+    def __init__(self, frame_dur):
+        self.frame_dur = frame_dur
+        self.reset()
+
+    def reset(self):
+        """Start a new timeline; the next flip becomes the anchor."""
+        self.anchor = None
+        self.elapsed_frames = 0
+
+    def plan(self, durations):
+        """Convert phase durations in seconds to frame counts (at least one frame each)."""
+        frames = np.round(np.asarray(durations, dtype=float) / self.frame_dur).astype(int)
+        return np.maximum(frames, 1)
+
+    def on_flip(self, t):
+        """Register a flip at session time ``t``; the first one sets the anchor."""
+        if self.anchor is None:
+            self.anchor = t
+
+    def frame_time(self, frame):
+        """Scheduled session time of ``frame`` (frames since the anchor), None before the anchor."""
+        if self.anchor is None:
+            return None
+        return self.anchor + frame * self.frame_dur
+
+    def is_due(self, t_flip, end_frame):
+        """True if the flip after ``t_flip`` belongs to the phase that starts at ``end_frame``."""
+        next_frame = (t_flip - self.anchor) / self.frame_dur + 1
+        return next_frame >= end_frame - 0.5
+
+    def resync(self, t_flip, end_frame):
+        """Re-anchor after a phase was ended early, so the next phase starts on the next flip."""
+        self.anchor = t_flip + self.frame_dur - end_frame * self.frame_dur
+
+
+class FrameTimer:
+    """
+    Low-overhead recorder of flip times with a per-phase timing report.
+
+    Every flip time is written into a preallocated ring buffer. Phases are
+    bracketed with ``start_phase()`` / ``end_phase()``; a phase is summarised
+    on the first flip of the next phase (its true offset), while its flips are
+    still in the buffer. Only the small per-phase summaries are kept.
+
+    Parameters
+    ----------
+    frame_dur : nominal refresh interval in seconds
+    capacity  : number of flips held by the ring buffer (default 65536)
+    """
+
+    columns = ["trial_nr", "block", "phase", "phase_name",
+               "intended_onset", "onset", "onset_error",
+               "intended_duration", "duration", "duration_error",
+               "n_frames", "dropped_frames"]
+
+    def __init__(self, frame_dur, capacity=2 ** 16):
+        self.frame_dur = frame_dur
+        self.capacity = capacity
+        self.flips = np.full(capacity, np.nan)
+        self.n_flips = 0          # total flips recorded, buffer index is n_flips % capacity
+
+        self.phases = []          # one summary dict per phase, see ``columns``
+        self._current = None      # phase being shown
+        self._closing = None      # phase waiting for its offset flip
+
+    def record(self, t):
+        """Record a flip at session time ``t``."""
+        self.flips[self.n_flips % self.capacity] = t
+        self.n_flips += 1
+        if self._closing is not None:
+            self._summarise(self._closing, t)
+            self._closing = None
+
+    def start_phase(self, trial_nr, block, phase, phase_name, intended_onset, intended_duration):
+        """Mark the next flip as the onset of a phase (``intended_onset`` None: not scheduled yet)."""
+        self._current = dict(
+            trial_nr=trial_nr, block=block, phase=phase, phase_name=phase_name,
+            intended_onset=intended_onset, intended_duration=intended_duration,
+            first=self.n_flips,
+        )
+
+    def end_phase(self):
+        """Mark the current phase as ended; it is summarised on the next flip."""
+        if self._current is not None:
+            self._current["last"] = self.n_flips
+            self._closing = self._current
+            self._current = None
+
+    def flush(self):
+        """Summarise a phase still waiting for its offset (end of a trial sequence or session)."""
+        if self._closing is not None and self.n_flips:
+            last_t = self.flips[(self.n_flips - 1) % self.capacity]
+            self._summarise(self._closing, last_t + self.frame_dur)
+            self._closing = None
+
+    def _summarise(self, info, offset):
+        first, last = info["first"], info["last"]
+        if last <= first or self.n_flips - first > self.capacity:
+            return  # no flips, or they were overwritten already
+
+        flips = self.flips[np.arange(first, last) % self.capacity]
+        intervals = np.diff(np.append(flips, offset))
+        dropped = np.maximum(np.round(intervals / self.frame_dur) - 1, 0).sum()
+        onset = float(flips[0])
+        duration = float(offset) - onset
+
+        # the first phase of a sequence defines the schedule, so it has no onset error
+        if info["intended_onset"] is None:
+            info["intended_onset"] = onset
+
+        self.phases.append(dict(
+            trial_nr=info["trial_nr"],
+            block=info["block"],
+            phase=info["phase"],
+            phase_name=info["phase_name"],
+            intended_onset=info["intended_onset"],
+            onset=onset,
+            onset_error=onset - info["intended_onset"],
+            intended_duration=info["intended_duration"],
+            duration=duration,
+            duration_error=duration - info["intended_duration"],
+            n_frames=last - first,
+            dropped_frames=int(dropped),
+        ))
+
+    def save(self, path):
+        """Write the per-phase timing report to a tab-separated file."""
+        self.flush()
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.columns, delimiter="\t")
+            writer.writeheader()
+            writer.writerows(self.phases)
@@ -7,12 +7,24 @@ Trial class for Episodic Extinction experiment.
 """
 
 from exptools2.core import Trial
-from psychopy import visual
-from psychopy import sound
-from psychopy.core import getTime, Clock
+from psychopy import visual, logging
 import numpy as np
 import os
 
+# Stimulus directory
+STIM_DIR = os.path.join(os.path.dirname(__file__), "stimulus_files")
+
+
+def stimulus_paths(parameters):
+    """Return the (CS, US) image paths of a trial; the CS path is None when there is no CS."""
+    cs = parameters.get("CS", "")
+    # cs_path = os.path.join(STIM_DIR, "CS_equalized", cs)  #for equalized luminance images
+    cs_path = os.path.join(STIM_DIR, "CS", cs) if cs else None
+    # us_path = os.path.join(STIM_DIR, "US_equalized", parameters["US"]) #for equalized luminance images
+    us_path = os.path.join(STIM_DIR, "US", parameters["US"])
+    return cs_path, us_path
+
+
 class KeyboardScale:
     """
     A horizontally sliding scale driven entirely by keypresses.
@@ -36,12 +48,13 @@ class KeyboardScale:
     question   : question text drawn above the scale
     left_key   : key name for leftward movement  (default 'left')
     right_key  : key name for rightward movement (default 'right')
+    capacity   : keypresses the trajectory buffer holds before it grows (default 256)
     """
 
     def __init__(self, win, pos, width=900,
                  min_val=0, max_val=10, start_val=5, step=1,
                  label_left='', label_right='', question='',
-                 left_key='left', right_key='right'):
+                 left_key='left', right_key='right', capacity=256):
 
         self.win = win
         self.pos = pos
@@ -56,6 +69,14 @@ class KeyboardScale:
         self._display_val = start_val   # value currently shown by the marker (lags behind self.value until first keypress)
         self.activated = False
         self._start_val = start_val     # stored for reset()
+        self.first_press = None         # session times of the first and last accepted keypress
+        self.last_press = None
+
+        # Trajectory of the current rating: time and value after every accepted keypress,
+        # preallocated so a keypress only writes two array elements
+        self._traj_t = np.empty(capacity, dtype=np.float64)
+        self._traj_v = np.empty(capacity, dtype=np.float32)
+        self._traj_n = 0
 
         cx, cy = pos
 
@@ -68,12 +89,6 @@ class KeyboardScale:
             pos=(cx, cy)
         )
 
-        # Question text (above the bar)
-        self.question_stim = visual.TextStim(
-            win, text=question, height=24, color='black', font='Arial',
-            pos=(cx, cy + 55), anchorHoriz='center'
-        )
-
         # Horizontal bar
         self.bar = visual.Line(
             win,
@@ -120,15 +135,30 @@ class KeyboardScale:
             pos=(cx, cy + 55), anchorHoriz='center'
         )
 
-        # Numeric readout (below marker)
-        self.readout_stim = visual.TextStim(
-            win, text=str(int(start_val)), height=20, color='black', font='Arial',
-            pos=(cx, cy - 60), anchorHoriz='center'
-        )
-        self.readout_stim.opacity = 0  # start invisible until first keypress
+        # Numeric readout (below the bar), one pre-rendered TextStim per
+        # possible value so moving the marker never re-lays out text
+        n_values = int(round((max_val - min_val) / step)) + 1
+        self._readouts = [
+            visual.TextStim(
+                win, text=str(round(min_val + i * step, 1)), height=20, color='black', font='Arial',
+                pos=(cx, cy - 60), anchorHoriz='center'
+            )
+            for i in range(n_values)
+        ]
+        self._readout_idx = self._val_to_index(start_val)
+        self._readout_visible = False  # start invisible until first keypress
 
     # ── Helpers ───────────────────────────────────────────────────────
 
+    def _val_to_index(self, val):
+        """Index of the pre-rendered readout for a value."""
+        return int(round((val - self.min_val) / self.step))
+
+    @property
+    def readout_stim(self):
+        """The readout TextStim of the value currently shown."""
+        return self._readouts[self._readout_idx]
+
     def _val_to_pos(self, val):
         """Convert a 0-100 value to an x-pixel position on the bar."""
         cx, cy = self.pos
@@ -143,28 +173,38 @@ class KeyboardScale:
         self.value = 999
         self._display_val = self._start_val
         self.activated = False
+        self.first_press = None
+        self.last_press = None
+        self._traj_n = 0
         self.marker.fillColor = "grey"
         self.marker.lineColor = "darkgrey"
-        self.readout_stim.opacity = 0  # hide readout until first keypress
+        self._readout_visible = False  # hide readout until first keypress
         self._refresh_marker()
 
-    def handle_key(self, key):
+    def handle_key(self, key, t=None):
         """
         Process a single keypress.
-        Call from get_events() with each key string received.
+        Called by the session's InputRouter with each key and its timestamp
+        (session time of the key event), which is kept for the rating's RT.
         Returns True if the key was consumed by this scale.
         """
+        if key in (self.left_key, self.right_key) and t is not None:
+            if self.first_press is None:
+                self.first_press = t
+            self.last_press = t
+
         if key == self.left_key:
             if not self.activated:
                 self.activated = True
                 self.value = self._display_val  # set to start_val on first press, then move on subsequent presses
                 self.marker.fillColor = "red"  # <- change color on first press
                 self.marker.lineColor = "black"
-                self.readout_stim.opacity = 1  # show readout on first keypress
+                self._readout_visible = True  # show readout on first keypress
             else:
                 self._display_val = max(self.min_val, self.value - self.step)
                 self.value = self._display_val
             self._refresh_marker()
+            self._record(t)
             return True
 
         elif key == self.right_key:
@@ -173,34 +213,91 @@ class KeyboardScale:
                 self.value = self._display_val  # set to start_val on first press, then move on subsequent presses
                 self.marker.fillColor = "red"  # <- change color on first press
                 self.marker.lineColor = "black"
-                self.readout_stim.opacity = 1  # show readout on first keypress
+                self._readout_visible = True  # show readout on first keypress
             else:
                 self._display_val = min(self.max_val, self.value + self.step)
                 self.value = self._display_val
             self._refresh_marker()
+            self._record(t)
             return True
         return False
 
+    def _record(self, t):
+        """Append (t, value) to the trajectory buffer, doubling it in the rare case it is full."""
+        n = self._traj_n
+        if n == len(self._traj_t):
+            self._traj_t = np.resize(self._traj_t, 2 * n)
+            self._traj_v = np.resize(self._traj_v, 2 * n)
+        self._traj_t[n] = np.nan if t is None else t
+        self._traj_v[n] = self.value
+        self._traj_n = n + 1
+
+    @property
+    def trajectory(self):
+        """(times, values) of the keypresses since the last reset(), as views of the buffer."""
+        return self._traj_t[:self._traj_n], self._traj_v[:self._traj_n]
+
     def _refresh_marker(self):
         """Update marker position and numeric readout to match self.value."""
         self.marker.pos = self._val_to_pos(self._display_val)
-        self.readout_stim.text = str(round(self._display_val, 1))
+        self._readout_idx = self._val_to_index(self._display_val)
 
     def getRating(self):
         """Return current value (mirrors visual.Slider API)."""
         return self.value
 
+    @property
+    def static_stims(self):
+        """Components that never change while rating (can be pre-rendered into a layer)."""
+        return (self.box, self.question_stim, self.bar, self.tick_left,
+                self.tick_right, self.label_left_stim, self.label_right_stim)
+
+    def draw_dynamic(self):
+        """Draw only the marker and numeric readout."""
+        self.marker.draw()
+        if self._readout_visible:
+            self.readout_stim.draw()
+
     def draw(self):
         """Draw all scale components."""
-        self.box.draw()
-        self.question_stim.draw()
-        self.bar.draw()
-        self.tick_left.draw()
-        self.tick_right.draw()
-        self.label_left_stim.draw()
-        self.label_right_stim.draw()
-        self.marker.draw()
-        self.readout_stim.draw()
+        for stim in self.static_stims:
+            stim.draw()
+        self.draw_dynamic()
+
+
+def make_rating_scales(session):
+    """
+    Create the distress and coherence scales once per session; every trial
+    reuses them through KeyboardScale.reset().
+    """
+    # Position: near the bottom of the screen for distress (shown over CS),
+    # centred for coherence (shown alone during ITI).
+    distress_pos  = (0, -session.settings["window"]["size"][1] // 2 - 20 - 50)
+    coherence_pos = (0, 0)
+
+    distress_scale = KeyboardScale(
+        win=session.win,
+        pos=distress_pos,
+        width=900,
+        min_val=0, max_val=10, start_val=5, step=1,
+        label_left='Not at all distressed',
+        label_right='Very distressed',
+        question='How distressed do you feel?',
+        left_key='left', right_key='right'       # ← change to '1'/'2' or 'b'/'y' for button box in fMRI
+    )
+
+    coherence_scale = KeyboardScale(
+        win=session.win,
+        pos=coherence_pos,
+        width=900,
+        min_val=0, max_val=10, start_val=5, step=1,
+        label_left='Not at all coherent',
+        label_right='Very coherent',
+        question='How coherent was your story?',
+        left_key='left', right_key='right'
+    )
+
+    return distress_scale, coherence_scale
 
 
 class ExtinctionTrial(Trial):
@@ -248,72 +345,43 @@ class ExtinctionTrial(Trial):
         # Set parameters dict
         self.parameters = parameters or {}
 
+        # Timing plan: phase durations in whole frames at the measured refresh rate
+        if timing == 'seconds':
+            self.phase_frames = self.session.scheduler.plan(self.phase_durations)
+        else:
+            self.phase_frames = list(self.phase_durations)
+
         # ============================ STIMULI =======================================
-        # Stimulus directory
-        stim_dir = os.path.join(os.path.dirname(__file__), "stimulus_files")
+        # CS/US images are shared through the session's texture cache, so each
+        # unique picture is decoded and uploaded only once per session.
         self.CS = self.parameters["CS"]
         self.US = self.parameters["US"]
         self.US_sound_file = self.parameters["US_sound"]
 
-        if parameters.get('CS', ''):
-            self.CS_img = visual.ImageStim(
-                self.session.win,
-                # image=os.path.join(stim_dir, "CS_equalized", self.CS),  #for equalized luminance images
-                image=os.path.join(stim_dir, "CS", self.CS),
-                size=(800, 800),
-                texRes=512,
-                interpolate=True
-            )
-        else:
-            self.CS_img = None  # No CS for this trial
-
-        self.US_img = visual.ImageStim(
-            self.session.win,
-            # image=os.path.join(stim_dir, "US_equalized", self.US), #for equalized luminance images
-            image=os.path.join(stim_dir, "US", self.US),
-            size=(800, 800),
-            texRes=512,
-            interpolate=True
-        )
+        # Resolved once, while the trial is built (during the preceding ITI); the trial
+        # keeps its stims, so a later eviction never forces a reload mid-phase
+        self.CS_path, self.US_path = stimulus_paths(self.parameters)
+        self.CS_img = None  # No CS for habituation trials
+        if self.CS_path is not None:
+            self.CS_img = self.session.textures.get(self.CS_path)
+        self.US_img = self.session.textures.get(self.US_path)
 
         # Fixation cross
         self.fixation = visual.TextStim(self.session.win, text='+', height=50, color='black', font="Arial")
 
-        # Sound
-        self.US_sound = sound.Sound(os.path.join(stim_dir, "USsounds", self.US_sound_file))
+        # Sound, shared handle from the session's preloaded audio pool
+        self.US_sound = self.session.audio.get(self.US_sound_file)
 
         # ============================ Use keyboard scales instead =======================================
-        # Position: near the bottom of the screen for distress (shown over CS),
-        # centred for coherence (shown alone during ITI).
-        distress_pos  = (0, -self.session.settings["window"]["size"][1] // 2 - 20 - 50)
-        coherence_pos = (0, 0)
-
-        self.distress_scale = KeyboardScale(
-            win=self.session.win,
-            pos=distress_pos,
-            width=900,
-            min_val=0, max_val=10, start_val=5, step=1,
-            label_left='Not at all distressed',
-            label_right='Very distressed',
-            question='How distressed do you feel?',
-            left_key='left', right_key='right'       # ← change to '1'/'2' or 'b'/'y' for button box in fMRI
-        )
-
-        self.coherence_scale = KeyboardScale(
-            win=self.session.win,
-            pos=coherence_pos,
-            width=900,
-            min_val=0, max_val=10, start_val=5, step=1,
-            label_left='Not at all coherent',
-            label_right='Very coherent',
-            question='How coherent was your story?',
-            left_key='left', right_key='right'
-        )
+        # Shared, session-level scales; reset() at the start of each rating phase
+        self.distress_scale = self.session.distress_scale
+        self.coherence_scale = self.session.coherence_scale
         # self.phase = None  # Initialize phase to avoid AttributeError
         # self.last_phase = None
 
-        # Track which scale is active so get_events() knows where to route keys
+        # Track which scale is active so the InputRouter knows where to route keys
         self._active_scale = None
+        self.phase_onset = None   # session time of the current phase's onset (set on its flip)
 
         #Set blocks and properties per block if needed
         self.block = self.parameters['block']
@@ -323,26 +391,56 @@ class ExtinctionTrial(Trial):
     # =========================================================================
 
     # For logging slider values, used in on_phase_end
-    def log_slider(self, value, phase_name=None):
-        """Log the distress slider value to the session's global_log."""
-        idx = self.session.global_log.shape[0]
-        self.session.global_log.loc[idx, 'trial_nr'] = self.trial_nr
-        self.session.global_log.loc[idx, 'onset'] = self.session.clock.getTime()
-        self.session.global_log.loc[idx, 'event_type'] = 'distress_rating' if phase_name is None else phase_name
-        self.session.global_log.loc[idx, 'phase'] = self.phase
-        self.session.global_log.loc[idx, 'response'] = value
-        self.session.global_log.loc[idx, 'nr_frames'] = self.session.nr_frames
+    def log_slider(self, value, phase_name=None, scale=None):
+        """
+        Log the distress slider value to the session's event log, with the
+        RTs of the first and last keypress on ``scale`` relative to the
+        phase onset (NaN without keypresses).
+        """
+        rt_first = rt_last = np.nan
+        if scale is not None and scale.first_press is not None and self.phase_onset is not None:
+            rt_first = scale.first_press - self.phase_onset
+            rt_last = scale.last_press - self.phase_onset
+
+        self.session.event_log.append(
+            trial_nr=self.trial_nr,
+            onset=self.session.clock.getTime(),
+            event_type='distress_rating' if phase_name is None else phase_name,
+            phase=self.phase,
+            response=value,
+            rt_first=rt_first,
+            rt=rt_last,
+            nr_frames=self.session.nr_frames,
+        )
+
+    def flush_trajectory(self, scale_name, scale):
+        """Copy the keypress trajectory of ``scale`` in this phase to the session's trajectory store."""
+        times, values = scale.trajectory
+        self.session.trajectories.add(scale_name, times, values, trial_nr=self.trial_nr,
+                                      block=self.block, phase=self.phase, onset=self.phase_onset)
+
+    def log_parameters(self):
+        """Trial parameters as event-log columns (array values split into one column per element)."""
+        params = {}
+        for param, val in self.parameters.items():
+            if isinstance(val, (np.ndarray, list)):
+                for i, x in enumerate(val):
+                    params[param + '_%4i' % i] = str(x)
+            else:
+                params[param] = val
+        return params
 
     #For stimulus logging, unnecessary at the moment, can be used in on_phase_start (for VAS value at phase start)
     def stim_log(self, stimulus):
-        """Log stimulus presentation to the session's global_log."""
-        idx = self.session.global_log.shape[0]
-        self.session.global_log.loc[idx, 'trial_nr'] = self.trial_nr
-        self.session.global_log.loc[idx, 'onset'] = self.session.clock.getTime()
-        self.session.global_log.loc[idx, 'event_type'] = self.phase_name + "_stim"
-        self.session.global_log.loc[idx, 'phase'] = self.phase
-        self.session.global_log.loc[idx, 'stimulus'] = stimulus
-        self.session.global_log.loc[idx, 'nr_frames'] = self.session.nr_frames
+        """Log stimulus presentation to the session's event log."""
+        self.session.event_log.append(
+            trial_nr=self.trial_nr,
+            onset=self.session.clock.getTime(),
+            event_type=self.phase_name + "_stim",
+            phase=self.phase,
+            stimulus=stimulus,
+            nr_frames=self.session.nr_frames,
+        )
 
     # =========================================================================
     # Phase hooks
@@ -361,7 +459,7 @@ class ExtinctionTrial(Trial):
 
         # Play US sound during US phase
         elif self.phase_name == "US":
-            self.US_sound.play()
+            self.session.audio.play(self.US_sound_file, trial_nr=self.trial_nr)
             self._active_scale = None  # No scale active during US presentation
 
         elif self.phase_name == "coherence":
@@ -380,14 +478,12 @@ class ExtinctionTrial(Trial):
             self.last_phase = self.phase
 
         # Draw stimuli per phase
-        elif self.phase_name == "CS":  # CS
-            self.CS_img.draw()
-            self.fixation.draw()
+        if self.phase_name == "CS":  # CS
+            self._draw_layer(*self._cs_layer())
 
         elif self.phase_name == "CS_distress":  # CS_distress
-            self.CS_img.draw()
-            self.fixation.draw()
-            self.distress_scale.draw()
+            self._draw_layer(*self._cs_distress_layer())
+            self.distress_scale.draw_dynamic()
 
         elif self.phase_name == "US":  # US
             self.US_img.draw()
@@ -398,6 +494,38 @@ class ExtinctionTrial(Trial):
 
         elif self.phase_name == "fixcross":  # fixcross
             self.fixation.draw()
+            # cheap frame: upload one background-decoded image for upcoming trials
+            self.session.textures.upload_ready()
+
+    # =========================================================================
+    # Static layers
+    # =========================================================================
+
+    def _cs_layer(self):
+        """Key and stimuli of the static CS screen."""
+        return ("CS", self.CS_path), (self.CS_img, self.fixation)
+
+    def _cs_distress_layer(self):
+        """Key and stimuli of the static part of the CS + distress scale screen."""
+        key = ("CS_distress", self.CS_path, id(self.distress_scale))
+        return key, (self.CS_img, self.fixation) + self.distress_scale.static_stims
+
+    def _draw_layer(self, key, stims):
+        """Blit the cached layer of ``stims`` (or draw them one by one without a layer cache)."""
+        if self.session.layers is None:
+            for stim in stims:
+                stim.draw()
+        else:
+            self.session.layers.get(key, stims).draw()
+
+    def prepare_layers(self):
+        """Capture this trial's static layers ahead of time, e.g. during the preceding ITI."""
+        if self.session.layers is None or self.CS_path is None:
+            return
+        if "CS" in self.phase_names:
+            self.session.layers.prepare(*self._cs_layer())
+        if "CS_distress" in self.phase_names:
+            self.session.layers.prepare(*self._cs_distress_layer())
 
     # =========================================================================
     # Event handling
@@ -405,21 +533,14 @@ class ExtinctionTrial(Trial):
 
     def get_events(self):
         """
-        Override the exptools2 get_events() so that during rating phases
-        keypresses are forwarded to the active KeyboardScale.
+        Override the exptools2 get_events(): keys come from the session's
+        InputRouter, timestamped at the key event and drained once per frame.
 
-        The super() call preserves all default exptools2 behaviour
-        (quit-key detection, trigger logging, etc.) and returns a list of
-        (key, timestamp) tuples that we can inspect afterwards.
+        The router keeps the exptools2 behaviour (quit key, response and
+        trigger logging, tracker messages) and forwards keys to the active
+        KeyboardScale. Returns a list of (key, timestamp) tuples.
         """
-        events = super().get_events()
-
-        # Route arrow keys (or button-box keys) to whichever scale is active
-        if self._active_scale is not None:
-            for key, t in events:
-                self._active_scale.handle_key(key)
-
-        return events
+        return self.session.inputs.dispatch(self)
 
     # =========================================================================
     # Phase end
@@ -436,13 +557,19 @@ class ExtinctionTrial(Trial):
         if self.phase_name in ("CS_distress", "CS_distress_only"):
             distress_rating = self.distress_scale.getRating()
             print(f"Distress rating recorded: {distress_rating}")
-            self.log_slider(value=distress_rating, phase_name='distress_value')
+            self.log_slider(value=distress_rating, phase_name='distress_value', scale=self.distress_scale)
+            self.flush_trajectory('distress', self.distress_scale)
 
         # Log slider value at end of coherence phase
         elif self.phase_name == "coherence":
             coherence_rating = self.coherence_scale.getRating() #if self._active_scale == self.coherence_scale else 999
             print(f"Coherence rating recorded: {coherence_rating}")
-            self.log_slider(value=coherence_rating, phase_name='coherence_value')
+            self.log_slider(value=coherence_rating, phase_name='coherence_value', scale=self.coherence_scale)
+            self.flush_trajectory('coherence', self.coherence_scale)
+
+        # Collect audio onset of the US sound for the A/V sync log
+        elif self.phase_name == "US":
+            self.session.audio.resolve()
 
         # Deactivate scale and reset phase-tracking sentinel
         self._active_scale = None
@@ -453,14 +580,79 @@ class ExtinctionTrial(Trial):
     # =========================================================================
 
     def log_phase_info(self, phase=None):
-        super().log_phase_info(phase)
+        """
+        Log a phase onset (called on the flip) to the session's event log.
+
+        Mirrors exptools2's Trial.log_phase_info (console output, tracker
+        messages, trial parameters as columns, nr_frames reset) but appends to
+        the array-backed event log instead of writing global_log cell by cell.
+        """
+        onset = self.session.clock.getTime()
+        if phase is None:
+            phase = self.phase
+
+        if phase == 0:
+            self.start_trial = onset
+            if self.verbose:
+                print(f'Starting trial {self.trial_nr}')
+
+        if self.verbose:
+            print(f'\tPhase {phase} start: {onset:.5f}')
+
         if self.eyetracker_on:  # send msg to eyetracker
+            self.session.tracker.sendMessage(f'start_type-stim_trial-{self.trial_nr}_phase-{phase}')
             msg = f'trial {self.trial_nr} parameter episode_nr : {self.parameters["episode_nr"]}'
             self.session.tracker.sendMessage(msg)
 
+        self.phase_onset = onset
+        params = self.log_parameters()  # add parameters to log
+
+        self.session.event_log.append(
+            trial_nr=self.trial_nr,
+            onset=onset,
+            event_type=self.phase_names[phase],
+            phase=phase,
+            nr_frames=self.session.nr_frames,
+            **params
+        )
+        self.session.nr_frames = 0
+
+    def load_next_trial(self, phase_dur):
+        """
+        Prefetch the upcoming trial(s) during this phase (the ITI).
+
+        The first frame of the phase is drawn and flipped before loading, so
+        the fixation cross is on screen while the next trial is being built.
+        """
+        self.draw()
+        self.flip()
+
+        load_start = self.session.clock.getTime()
+        self.session.create_trial(self.trial_nr + 1)
+        load_dur = self.session.clock.getTime() - load_start
+
+        if load_dur > phase_dur:
+            logging.warn(f'Loading the next trial took {load_dur:.3f} s, longer than '
+                         f'phase duration {phase_dur:.3f} s (trial {self.trial_nr})!')
+
+    def flip(self):
+        """Flip the window and return its session time; counts the frame and feeds the
+        frame scheduler (and the frame timer when frame timing is on)."""
+        self.session.win.flip()
+        t_flip = self.session.clock.getTime()
+        self.session.nr_frames += 1
+        self.session.scheduler.on_flip(t_flip)
+        if self.session.frame_timer is not None:
+            self.session.frame_timer.record(t_flip)
+        return t_flip
 
     def run(self):
-        """Run the trial, ensuring phase_end is called."""
+        """Run the trial, ensuring phase_end is called.
+
+        In seconds mode phases are frame-locked: each phase lasts the number
+        of frames planned at trial creation, scheduled on the session-wide
+        timeline of the session's FrameScheduler.
+        """
         self.last_phase = None
         self.phase = 0
         self.exit_phase = False
@@ -469,14 +661,26 @@ class ExtinctionTrial(Trial):
         # log trial start in session time
         print(f"Trial {self.trial_nr} starts at {self.session.clock.getTime():.3f}")
 
-        trial_clock = Clock()
-        trial_clock.reset()
+        scheduler = self.session.scheduler
+        end_frame = scheduler.elapsed_frames
 
-        phase_start = 0.0
+        markers = self.session.markers
+        frame_timer = self.session.frame_timer
 
-        useParallel = hasattr(self.session, "parallelPort")
+        for phase_dur, phase_frames in zip(self.phase_durations, self.phase_frames):
 
-        for phase_dur in self.phase_durations:
+            start_frame = end_frame
+            end_frame = start_frame + phase_frames
+
+            if frame_timer is not None:
+                frame_timer.start_phase(
+                    trial_nr=self.trial_nr,
+                    block=self.block,
+                    phase=self.phase,
+                    phase_name=self.phase_names[self.phase],
+                    intended_onset=scheduler.frame_time(start_frame),
+                    intended_duration=phase_frames * scheduler.frame_dur,
+                )
 
             # Log phase start ON FLIP, using SESSION time
             self.session.win.callOnFlip(
@@ -484,33 +688,29 @@ class ExtinctionTrial(Trial):
                 phase=self.phase
             )
 
-            if hasattr(self.session, "serialPort"):
-                self.session.win.callOnFlip(self.session.serialPort.write, bytearray([self.parameters["episode_nr"]]))
-
-            if useParallel:
-                self.session.win.callOnFlip(self.session.parallelPort.setData, self.parameters["episode_nr"])
-                self.parallelPortStartFrame = 0 # log_phase_info sets session nr_frames to 0.
+            # Marker stamped on the same flip; port I/O and pulse reset happen on the marker thread
+            if markers is not None:
+                self.session.win.callOnFlip(markers.on_flip, self.parameters["episode_nr"],
+                                            trial_nr=self.trial_nr, phase=self.phase)
 
             # load next trial if needed
             if self.load_next_during_phase == self.phase:
                 self.load_next_trial(phase_dur)
 
-             # ---- PHASE LOOP (SECONDS MODE) ----
+             # ---- PHASE LOOP (SECONDS MODE, FRAME-LOCKED) ----
             if self.timing == 'seconds':
 
-                while (
-                    trial_clock.getTime() < phase_start + phase_dur
-                    and not self.exit_phase
-                    and not self.exit_trial
-                ):
+                while not self.exit_phase and not self.exit_trial:
                     self.draw()
                     if self.draw_each_frame:
-                        if useParallel and self.session.nr_frames == self.parallelPortStartFrame + 1:
-                            self.session.win.callOnFlip(self.session.parallelPort.setData, 0)
-                        self.session.win.flip()
-                        self.session.nr_frames += 1
+                        t_flip = self.flip()
+                    else:
+                        t_flip = self.session.clock.getTime()
+                        scheduler.on_flip(t_flip)
                     self.get_events()
 
+                    if scheduler.is_due(t_flip, end_frame):
+                        break
 
             # ---- PHASE LOOP (FRAMES MODE) ----
             else:
@@ -518,12 +718,19 @@ class ExtinctionTrial(Trial):
                     if self.exit_phase or self.exit_trial:
                         break
                     self.draw()
-                    self.session.win.flip()
+                    self.flip()
                     self.get_events()
-                    self.session.nr_frames += 1
+
+            if self.exit_phase or self.exit_trial:
+                # phase was cut short: continue the timeline from here
+                scheduler.resync(self.session.clock.getTime(), end_frame)
+            # the next phase (or trial) is scheduled from here, also after exit_trial
+            scheduler.elapsed_frames = end_frame
 
             # Phase end hook
             self.on_phase_end()
+            if frame_timer is not None:
+                frame_timer.end_phase()
 
             # reset exit_phase
             if self.exit_phase:
@@ -532,5 +739,4 @@ class ExtinctionTrial(Trial):
             if self.exit_trial:
                 break
 
-            phase_start += phase_dur
             self.phase += 1
\ No newline at end of file